@@ -0,0 +1,252 @@
+'''
+Combines the results of many runs one run at a time, without keeping the
+runs themselves.  For each numeric statistic the median and median absolute
+deviation are found, for each dictionary of counters (such as
+``active_bits_changed``) the counts are summed, and the success rate is
+tracked.  Aggregates built separately, for instance by parallel workers or
+from different files, can be merged to give the same result as if all of
+the runs had been added to one aggregate.
+
+By default all values are kept so medians are exact.  When aggregating very
+large numbers of runs, a ``sketch_size`` can be given to bound how many
+values are kept for each statistic, at the cost of approximate medians.
+'''
+
+from numbers import Number
+
+
+class QuantileSketch(object):
+    '''
+    Mergeable summary of a collection of numbers which can estimate their
+    quantiles.  Values are stored in levels, where each value in level ``i``
+    represents ``2 ** i`` of the original values.  When a level holds more
+    than ``capacity`` values, it is sorted and every other value is promoted
+    to the next level.  If ``capacity`` is None, no values are ever
+    discarded and all quantiles are exact.
+    '''
+    def __init__(self, capacity=None):
+        self.capacity = capacity
+        self.levels = [[]]
+        self.count = 0
+        # Alternates which half of a level is kept when compacting
+        self.offsets = [0]
+
+    def add(self, value):
+        '''
+        Include a single value in the sketch.
+        '''
+        self.levels[0].append(value)
+        self.count += 1
+        self.compact()
+
+    def merge(self, other):
+        '''
+        Include all of the values summarized by ``other`` in this sketch.
+        '''
+        for level, values in enumerate(other.levels):
+            self.level(level).extend(values)
+        self.count += other.count
+        self.compact()
+
+    def level(self, level):
+        '''
+        Returns the list of values stored at ``level``, creating it if needed.
+        '''
+        while len(self.levels) <= level:
+            self.levels.append([])
+            self.offsets.append(0)
+        return self.levels[level]
+
+    def compact(self):
+        '''
+        Promotes values from any level holding more than ``capacity`` values.
+        '''
+        if self.capacity is None:
+            return
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) > self.capacity:
+                values.sort()
+                # Odd sized levels keep their largest value
+                kept = values[-1:] if len(values) % 2 else []
+                paired = values[:len(values) - len(kept)]
+                offset = self.offsets[level]
+                self.offsets[level] = 1 - offset
+                self.level(level + 1).extend(paired[offset::2])
+                self.levels[level] = kept
+            level += 1
+
+    def weighted(self):
+        '''
+        Returns a sorted list of (value, weight) pairs for all stored values.
+        '''
+        return sorted((value, 2 ** level)
+                      for level, values in enumerate(self.levels)
+                      for value in values)
+
+    def median(self):
+        '''
+        Returns the median of the values, which is exact if no values have
+        been discarded.
+        '''
+        return weighted_median(self.weighted())
+
+    def median_deviation(self):
+        '''
+        Returns the median and the median absolute deviation of the values,
+        similar to ``util.median_deviation``.
+        '''
+        pairs = self.weighted()
+        median = weighted_median(pairs)
+        deviations = sorted((abs(value - median), weight)
+                            for value, weight in pairs)
+        return median, weighted_median(deviations)
+
+
+def weighted_median(pairs):
+    '''
+    Returns the median of a sorted list of (value, weight) pairs.  If the
+    total weight is split evenly between two values, the average of the two
+    is returned, matching ``util.find_median`` when all weights are 1.
+    '''
+    total = sum(weight for _, weight in pairs)
+    if total == 0:
+        raise ValueError('Cannot find the median of no values')
+    middle = total / 2.0
+    seen = 0
+    for index, (value, weight) in enumerate(pairs):
+        seen += weight
+        if seen > middle:
+            return value
+        if seen == middle:
+            return (value + pairs[index + 1][0]) / 2.0
+
+
+class Aggregate(object):
+    '''
+    Combines the result dictionaries returned by ``main.one_run``.
+    '''
+    def __init__(self, sketch_size=None):
+        '''
+        Parameters:
+
+        - ``sketch_size``: If given, limits how many values are kept for each
+          numeric statistic.  If None, all values are kept.
+        '''
+        self.sketch_size = sketch_size
+        self.statistics = {}
+        self.counters = {}
+        self.runs = 0
+        self.successful = 0
+
+    def add(self, result):
+        '''
+        Include a single run's result dictionary.  Values that are neither
+        numbers nor dictionaries of counts are ignored.
+        '''
+        self.runs += 1
+        for key, value in result.iteritems():
+            if key == 'success':
+                self.successful += int(value)
+            elif isinstance(value, Number):
+                try:
+                    self.statistics[key].add(value)
+                except KeyError:
+                    self.statistics[key] = QuantileSketch(self.sketch_size)
+                    self.statistics[key].add(value)
+            elif isinstance(value, dict):
+                self.add_counts(key, value)
+
+    def merge(self, other):
+        '''
+        Include all of the runs added to ``other``.
+        '''
+        self.runs += other.runs
+        self.successful += other.successful
+        for key, sketch in other.statistics.iteritems():
+            try:
+                self.statistics[key].merge(sketch)
+            except KeyError:
+                self.statistics[key] = QuantileSketch(self.sketch_size)
+                self.statistics[key].merge(sketch)
+        for key, counter in other.counters.iteritems():
+            self.add_counts(key, counter)
+
+    def add_counts(self, key, counts):
+        '''
+        Adds a dictionary of ``counts`` to the counter called ``key``.  As
+        results read from files use strings for the counted values, all
+        counted values are converted to strings.
+        '''
+        counter = self.counters.setdefault(key, {})
+        for change, count in counts.iteritems():
+            change = str(change)
+            counter[change] = counter.get(change, 0) + count
+
+    def results(self):
+        '''
+        Returns a dictionary mapping each numeric statistic to its median and
+        median absolute deviation, each counter to its summed counts, and
+        ``success`` to the fraction of successful runs.
+        '''
+        combined = {key: sketch.median_deviation()
+                    for key, sketch in self.statistics.iteritems()}
+        for key, counter in self.counters.iteritems():
+            combined[key] = dict(counter)
+        try:
+            combined['success'] = self.successful / float(self.runs), 0
+        except ZeroDivisionError:
+            combined['success'] = 0, 0
+        return combined
+
+
+def aggregate_file(args):
+    '''
+    Returns an ``Aggregate`` of all runs in a single result file, given a
+    tuple of the file name and ``sketch_size``.
+    '''
+    from util import load_list
+    filename, sketch_size = args
+    aggregate = Aggregate(sketch_size)
+    for result in load_list(filename)[1:]:
+        aggregate.add(result)
+    return aggregate
+
+
+def aggregate_files(filenames, sketch_size=None, processes=None):
+    '''
+    Returns an ``Aggregate`` of all runs in all of the result files.  Each
+    file is aggregated separately, in parallel, and the results merged.
+
+    Parameters:
+
+    - ``filenames``: The list of result files to combine.
+    - ``sketch_size``: Passed on to each ``Aggregate``.
+    - ``processes``: How many processes to use.  If None, one process is
+      used per CPU.
+    '''
+    from multiprocessing import Pool
+    combined = Aggregate(sketch_size)
+    pool = Pool(processes)
+    jobs = [(filename, sketch_size) for filename in filenames]
+    for aggregate in pool.imap_unordered(aggregate_file, jobs):
+        combined.merge(aggregate)
+    pool.close()
+    return combined
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Combine the runs from many result files.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filenames', metavar='Result Files', type=str,
+                        nargs='+', help='The result files to combine')
+    parser.add_argument('-sketch', dest='sketch_size', type=int,
+                        help='Limit how many values are kept per statistic.')
+    parser.add_argument('-processes', dest='processes', type=int,
+                        help='How many processes to use.')
+    args = parser.parse_args()
+    combined = aggregate_files(args.filenames, args.sketch_size,
+                               args.processes)
+    for key, value in sorted(combined.results().items()):
+        print key, value
@@ -0,0 +1,181 @@
+'''
+Stores the ``never_active`` information of every recorded best in a compact
+form that can be analyzed without loading it into memory.  An archive is a
+directory containing:
+
+- ``bits.dat``: A matrix with one row per recorded best, holding the
+  ``never_active`` flags of each node packed into bits.  The rows of each run
+  are stored together, sorted by fitness.
+- ``fitness.dat``: The fitness of each row of ``bits.dat``.
+- ``header.json``: The shape of the matrix and which rows belong to each run.
+
+Both ``.dat`` files are read using ``numpy.memmap``, so only the rows being
+used are ever loaded.  Use this module as an executable to create an archive
+for the results of a single problem and variant:
+
+``python archive.py parity_normal_normal final/parity_normal_normal_*.dat.gz``
+
+The resulting archive can then be passed to ``never_actives.py`` instead of
+the result files.
+'''
+
+import os
+import sys
+import json
+import numpy as np
+from history import expand_bests, get_best
+
+
+class ArchiveWriter(object):
+    '''
+    Adds runs to a new archive one at a time.
+    '''
+    def __init__(self, directory):
+        '''
+        Creates the archive ``directory`` and opens its files for writing.
+        '''
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.bits = open(os.path.join(directory, 'bits.dat'), 'wb')
+        self.fitness = open(os.path.join(directory, 'fitness.dat'), 'wb')
+        self.genome_size = None
+        self.row_bytes = None
+        self.rows = 0
+        self.runs = []
+
+    def add_run(self, bests, unused=None, filename=None):
+        '''
+        Adds all of the bests from a single run.  All runs are stored using
+        the genome size of the first run, and the archive's genome size is
+        the smallest of all the runs.
+
+        Parameters:
+
+        - ``bests``: The list of recorded bests from the run, which may use
+          delta encoding.
+        - ``unused``: The number of nodes which were never active at the end
+          of the run.
+        - ``filename``: The name of the file the run came from.
+        '''
+        # Keep only the last best recorded at each fitness level
+        by_fitness = {}
+        for best in expand_bests(bests):
+            by_fitness[best['fitness']] = best['never_active']
+        final_length = get_best(bests, -1)['graph_length']
+        if self.genome_size is None:
+            self.genome_size = final_length
+            self.row_bytes = (final_length + 7) // 8
+        else:
+            self.genome_size = min(self.genome_size, final_length)
+        row_length = self.row_bytes * 8
+        fitnesses = sorted(by_fitness)
+        for fitness in fitnesses:
+            flags = by_fitness[fitness][:row_length]
+            flags = np.frombuffer(str(flags), dtype=np.uint8) == ord('1')
+            row = np.zeros(row_length, dtype=np.bool_)
+            row[:len(flags)] = flags
+            self.bits.write(np.packbits(row).tostring())
+        self.fitness.write(np.array(fitnesses, dtype=np.float64).tostring())
+        self.runs.append({'filename': filename,
+                          'offset': self.rows,
+                          'length': len(fitnesses),
+                          'graph_length': final_length,
+                          'unused': unused})
+        self.rows += len(fitnesses)
+
+    def close(self):
+        '''
+        Finishes writing the archive, making it ready to be read by
+        ``Archive``.
+        '''
+        self.bits.close()
+        self.fitness.close()
+        header = {'genome_size': self.genome_size,
+                  'row_bytes': self.row_bytes,
+                  'rows': self.rows,
+                  'runs': self.runs}
+        with open(os.path.join(self.directory, 'header.json'), 'w') as f:
+            json.dump(header, f)
+
+
+class Archive(object):
+    '''
+    Read only view of an archive created by ``ArchiveWriter``.
+    '''
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'header.json'), 'r') as f:
+            header = json.load(f)
+        self.genome_size = header['genome_size']
+        self.runs = header['runs']
+        rows = header['rows']
+        if rows:
+            self.bits = np.memmap(os.path.join(directory, 'bits.dat'),
+                                  dtype=np.uint8, mode='r',
+                                  shape=(rows, header['row_bytes']))
+            self.fitness = np.memmap(os.path.join(directory, 'fitness.dat'),
+                                     dtype=np.float64, mode='r',
+                                     shape=(rows,))
+        else:
+            self.bits = np.zeros((0, header['row_bytes']), dtype=np.uint8)
+            self.fitness = np.zeros(0, dtype=np.float64)
+
+    def align(self, scan_lines):
+        '''
+        For each run, finds the row of the highest fitness which does not
+        exceed each scan line.  Returns a matrix with one row per run and
+        one column per scan line, with -1 marking scan lines the run has no
+        fitness below.
+
+        Parameters:
+
+        - ``scan_lines``: Sorted list of fitness levels.
+        '''
+        scan_lines = np.asarray(scan_lines, dtype=np.float64)
+        aligned = np.empty((len(self.runs), len(scan_lines)), dtype=np.int64)
+        for number, run in enumerate(self.runs):
+            start = run['offset']
+            fitness = self.fitness[start:start + run['length']]
+            found = np.searchsorted(fitness, scan_lines, side='right') - 1
+            aligned[number] = np.where(found >= 0, found + start, -1)
+        return aligned
+
+    def never_active_percent(self, rows, chunk_size=256):
+        '''
+        Returns the percentage of ``rows`` in which each node was never
+        active, reading at most ``chunk_size`` rows at a time.
+        '''
+        counts = np.zeros(self.bits.shape[1] * 8, dtype=np.int64)
+        rows = np.sort(rows)
+        for start in range(0, len(rows), chunk_size):
+            chunk = self.bits[rows[start:start + chunk_size]]
+            unpacked = np.unpackbits(chunk, axis=1)
+            counts += unpacked.sum(axis=0, dtype=np.int64)
+        return counts[:self.genome_size] / float(len(rows)) * 100
+
+
+def group_means(values, groups):
+    '''
+    Splits ``values`` into ``groups`` equal sized pieces and returns the mean
+    of each.  If the values do not split evenly, at most one more piece of
+    the same size is taken from the remainder and averaged, as the original
+    ``never_actives.py`` did.
+    '''
+    size = len(values) // groups
+    merged = values[:groups * size].reshape(groups, size).mean(axis=1)
+    remainder = values[groups * size:(groups + 1) * size]
+    if len(remainder):
+        merged = np.append(merged, remainder.mean())
+    return merged
+
+if __name__ == '__main__':
+    from loader import load_fields
+    writer = ArchiveWriter(sys.argv[1])
+    for filename, data in load_fields(sys.argv[2:], [(1, 'unused'),
+                                                     (1, 'bests')]):
+        try:
+            print 'Processing file', filename
+            writer.add_run(data[1, 'bests'], data[1, 'unused'], filename)
+        except ValueError:
+            print filename, "FAILED"
+    writer.close()
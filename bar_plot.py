@@ -11,106 +11,94 @@ NOTE: You CANNOT use pypy for this as pylab is current unsupported.  Use
 python 2.7 instead.
 '''
 
-import json
 import sys
 from os import path
 from collections import defaultdict
-from util import open_file_method, set_fonts
-from evolution import Individual
-from pylab import show, savefig
-import pylab as plt
-from numpy import zeros
+from util import set_fonts
+from pipeline import Stage, run
+from semantics import node_classes
 
 
-if __name__ == '__main__':
+class BarPlot(Stage):
+    '''
+    Analysis stage which counts the behavior of nodes in the final best
+    individuals and plots the averages as a bar chart.
+    '''
+    fields = [('reconstruct', 1)]
+    group = 3
 
-    set_fonts()
-    filecount = 0
+    def __init__(self, display=True):
+        '''
+        Parameters:
 
-    behavior = defaultdict(lambda: zeros(2))
+        - ``display``: If the plot should be shown after it is saved.
+        '''
+        self.display = display
+        self.filecount = 0
+        self.behavior = defaultdict(lambda: [0, 0])
+        self.outname = None
 
-    outname = None
-    # Run through all of the files gathering different seeds into lists
-    for filename in sys.argv[1:]:
+    def add(self, filename, data):
+        '''
+        Count the node classifications from a single file.
+        '''
         base = path.basename(filename)
         try:
             print 'Processing file', filename
-            # Load the file
-            with open_file_method(filename)(filename, 'r') as f:
-                data = json.load(f)
             # Extract details about the configuration from the file's name
-            outname = base.split('_')[:3]
-            best = data[1]['bests'][-1]
-            test = data[1]['test_inputs']
+            self.outname = base.split('_')[:3]
+            # Classification of each node in the run's best individual,
+            # reconstructed using semantics.reconstruct_run
+            classes = data['reconstruct', 1]['classes']
+            for key in node_classes:
+                counts = self.behavior[key]
+                for index, count in enumerate(classes[key]):
+                    counts[index] += count
+            self.filecount += 1
+        except ValueError:
+            print filename, "FAILED"
 
-            # Semantics of always true / always false
-            constants = {0, 2 ** len(test) - 1}
+    def finish(self):
+        '''
+        Save the bar chart using the average counts of each class.
+        '''
+        from pylab import show, savefig
+        import pylab as plt
+        print "Loaded", self.filecount
+        set_fonts()
 
-            # Reconstruct the best individual found in this run
-            individual = Individual.reconstruct_individual(best, test)
-            simplified = individual.new(Individual.simplify)
+        # Plotting tools
+        one = ('Used', 'Explore')
+        both = ('Useful', 'Intron', 'Constant')
+        width = 0.2
+        results = []
+        colors = ['m', 'y', 'c', 'g', 'b', 'r']
+        hatches = ('\\', '//', '\\\\', '/', 'x',
+                   '.', '-', '+', '*', 'o', 'O')
+        names = []
+        total = float(self.filecount)
+        for index, key in enumerate(one):
+            results.append(plt.bar(index, max(self.behavior[key]) / total,
+                                   width,
+                                   color=colors[len(names) % len(colors)],
+                                   hatch=hatches[len(names) % len(hatches)]))
+            names.append(key)
+        for index, key in enumerate(both):
+            offset = width * (index + 1)
+            locs = [offset, offset + 1]
+            results.append(plt.bar(locs, [count / total for count in
+                                          self.behavior[key]], width,
+                                   color=colors[len(names) % len(colors)],
+                                   hatch=hatches[len(names) % len(hatches)]))
+            names.append(key)
+        plt.ylabel('Average Number Of Nodes')
+        plt.xticks([0.4, 1.4], ['Active', 'Inactive'])
+        plt.legend(zip(*results)[0], names, loc='best')
+        savefig('bar_' + '_'.join(self.outname) + '.eps', dpi=300)
+        if self.display:
+            show()
+        plt.close()
 
-            active_indices = set(individual.active)
-            used_indices = set(simplified.active)
 
-            # Find the set of semantics used in the simplified individual
-            useful_semantics = {simplified.semantics[node_index]
-                                for node_index in simplified.active
-                                if simplified.semantics[node_index]
-                                not in constants}
-            # Find the set of semantics in the active individual.  Superset of useful.
-            active_semantics = {individual.semantics[node_index] for node_index
-                                in individual.active}
-            # Look at each nodes semantics
-            for node_index in range(individual.graph_length):
-                if individual.never_active[node_index]:
-                    continue
-                semantic = individual.semantics[node_index]
-                activity = int(node_index not in active_indices)
-                key = None
-                # Determine what kind of node this is
-                if semantic in constants:
-                    key = 'Constant'
-                elif semantic in useful_semantics:
-                    if node_index in used_indices:
-                        key = 'Used'
-                    else:
-                        key = 'Useful'
-                elif semantic in active_semantics:
-                    key = 'Intron'
-                else:
-                    key = 'Explore'
-                behavior[key][activity] += 1
-            filecount += 1
-        except ValueError:
-            print filename, "FAILED"
-    print "Loaded", filecount
-
-    # Plotting tools
-    one = ('Used', 'Explore')
-    both = ('Useful', 'Intron', 'Constant')
-    width = 0.2
-    results = []
-    bar_type = 0
-    colors = ['m', 'y', 'c', 'g', 'b', 'r']
-    hatches = patterns = ('\\', '//', '\\\\', '/', 'x',
-                          '.', '-', '+', '*', 'o', 'O')
-    names = []
-    total = float(filecount)
-    for index, key in enumerate(one):
-        results.append(plt.bar(index, max(behavior[key]) / total, width,
-                               color=colors[len(names) % len(colors)],
-                               hatch=hatches[len(names) % len(hatches)]))
-        names.append(key)
-    for index, key in enumerate(both):
-        offset = width * (index + 1)
-        locs = [offset, offset + 1]
-        results.append(plt.bar(locs, behavior[key] / total, width,
-                               color=colors[len(names) % len(colors)],
-                               hatch=hatches[len(names) % len(hatches)]))
-        names.append(key)
-    plt.ylabel('Average Number Of Nodes')
-    plt.xticks([0.4, 1.4], ['Active', 'Inactive'])
-    plt.legend(zip(*results)[0], names, loc='best')
-    savefig('bar_' + '_'.join(outname) + '.eps', dpi=300)
-    show()
+if __name__ == '__main__':
+    run([BarPlot()], sys.argv[1:])
@@ -0,0 +1,350 @@
+'''
+Times the methods of ``Individual`` which are called most often during
+evolution, as well as each problem's ``get_fitness``, on individuals
+created from the problem configurations in cfg/.  All individuals and
+mutations are created using fixed seeds so every run of the benchmarks
+performs the same work.  Use this module as an executable to save the
+timing results:
+
+``python benchmark.py -out benchmark.json``
+
+and later compare against those results to find any slowdowns:
+
+``python benchmark.py -baseline benchmark.json``
+
+To time ``get_fitness`` on evolved genomes instead of random ones, include a
+corpus created by ``corpus.py``:
+
+``python benchmark.py -corpus corpus.json.gz -out benchmark.json``
+
+NOTE: ``evolution.generate`` replaces methods of ``Individual`` depending on
+the configuration, so always run the benchmarks in their own process.
+'''
+
+import sys
+import json
+import random
+import itertools
+from glob import glob
+from os import path
+from timeit import default_timer
+from evolution import Individual
+import problems
+import util
+
+# Configuration files which do not define a problem
+not_problems = ['base.cfg', 'once.cfg']
+
+
+def unchanged(individual):
+    '''
+    Modification method for ``Individual.new`` which does not change the
+    individual.
+    '''
+    pass
+
+
+def load_problem(filename, graph_length=None):
+    '''
+    Returns the configuration and problem evaluator defined by a problem
+    configuration file, combined with cfg/once.cfg.
+
+    Parameters:
+
+    - ``filename``: The problem's configuration file.
+    - ``graph_length``: If given, overrides the problem's ``graph_length``.
+    '''
+    directory = path.dirname(filename)
+    config = util.load_configurations([path.join(directory, 'once.cfg'),
+                                       filename])
+    if graph_length is not None:
+        config['graph_length'] = graph_length
+    evaluator = problems.__dict__[config['problem']](config)
+    config['function_list'] = evaluator.operators
+    config['max_arity'] = evaluator.max_arity
+    return config, evaluator
+
+
+def create_parent(config, evaluator, seed):
+    '''
+    Returns a new individual created using ``seed`` which has had its
+    fitness set.
+    '''
+    random.seed(seed)
+    parent = Individual(**config)
+    parent.fitness = evaluator.get_fitness(parent)
+    return parent
+
+
+def test_inputs(evaluator):
+    '''
+    Returns a generator which cycles through the problem's test inputs, or
+    None if the problem does not use test inputs.
+    '''
+    try:
+        return itertools.cycle([inputs for inputs, _ in evaluator.training])
+    except AttributeError:
+        return None
+
+
+# Each benchmark creates the function to be timed given the configuration,
+# problem evaluator and a parent individual.  Benchmarks return None if they
+# do not apply to the problem.
+def bench_new(config, evaluator, parent):
+    return lambda: parent.new(unchanged)
+
+
+def bench_mutate(config, evaluator, parent):
+    working = parent.new(unchanged)
+    return lambda: working.mutate(config['mutation_rate'])
+
+
+def bench_one_active_mutation(config, evaluator, parent):
+    working = parent.new(unchanged)
+    return lambda: working.one_active_mutation(config['mutation_rate'])
+
+
+def bench_determine_active_nodes(config, evaluator, parent):
+    return parent.determine_active_nodes
+
+
+def bench_dag_determine_active_nodes(config, evaluator, parent):
+    working = parent.new(unchanged)
+    return working.dag_determine_active_nodes
+
+
+def bench_valid_reconnect(config, evaluator, parent):
+    length = config['graph_length']
+    return lambda: parent.valid_reconnect(random.randrange(length))
+
+
+def bench_reorder(config, evaluator, parent):
+    working = parent.new(unchanged)
+    return working.reorder
+
+
+def bench_evaluate(config, evaluator, parent):
+    inputs = test_inputs(evaluator)
+    if inputs is None:
+        return None
+    return lambda: parent.evaluate(next(inputs))
+
+
+def bench_asym_phenotypic_difference(config, evaluator, parent):
+    child = parent.new(Individual.mutate, config['mutation_rate'])
+    return lambda: parent.asym_phenotypic_difference(child)
+
+
+def bench_simplify(config, evaluator, parent):
+    return lambda: parent.new(Individual.simplify)
+
+
+def bench_get_fitness(config, evaluator, parent):
+    return lambda: evaluator.get_fitness(parent)
+
+benchmarks = [('new', bench_new),
+              ('mutate', bench_mutate),
+              ('one_active_mutation', bench_one_active_mutation),
+              ('determine_active_nodes', bench_determine_active_nodes),
+              ('dag_determine_active_nodes',
+               bench_dag_determine_active_nodes),
+              ('valid_reconnect', bench_valid_reconnect),
+              ('reorder', bench_reorder),
+              ('evaluate', bench_evaluate),
+              ('asym_phenotypic_difference',
+               bench_asym_phenotypic_difference),
+              ('simplify', bench_simplify),
+              ('get_fitness', bench_get_fitness)]
+
+
+def measure(create, seed, repeat=5, min_time=0.2):
+    '''
+    Times a benchmark, returning a dictionary containing the ``best`` and
+    ``median`` time per call in seconds, and how many ``calls`` were made
+    in each repetition.  Returns None if the benchmark does not apply.
+
+    Parameters:
+
+    - ``create``: Function which returns the function to time.  Called
+      before each repetition with the random seed reset to ``seed``.
+    - ``seed``: The random seed used for each repetition.
+    - ``repeat``: How many times to repeat the measurement.
+    - ``min_time``: The minimum number of seconds each repetition should
+      take, used to decide how many calls to make.
+    '''
+    random.seed(seed)
+    function = create()
+    if function is None:
+        return None
+    # Find how many calls are needed to take at least min_time
+    calls = 1
+    while True:
+        random.seed(seed)
+        function = create()
+        start = default_timer()
+        for _ in xrange(calls):
+            function()
+        elapsed = default_timer() - start
+        if elapsed >= min_time:
+            break
+        calls *= 10 if elapsed < min_time / 10 else 2
+    times = [elapsed / calls]
+    for _ in range(repeat - 1):
+        random.seed(seed)
+        function = create()
+        start = default_timer()
+        for _ in xrange(calls):
+            function()
+        times.append((default_timer() - start) / calls)
+    return {'best': min(times),
+            'median': util.find_median(times),
+            'calls': calls}
+
+
+def run_benchmarks(filenames, names=None, seed=0, repeat=5, min_time=0.2,
+                   graph_length=None):
+    '''
+    Performs the benchmarks on each problem configuration, returning a
+    dictionary mapping the name of each configuration file to its results.
+    Problems which cannot be created are reported and skipped.
+
+    Parameters:
+
+    - ``filenames``: The problem configuration files to use.
+    - ``names``: Which benchmarks to perform, defaulting to all.
+    - ``seed``: The random seed used to create individuals.
+    - ``repeat``: Passed on to ``measure``.
+    - ``min_time``: Passed on to ``measure``.
+    - ``graph_length``: If given, overrides the problems' ``graph_length``.
+    '''
+    results = {}
+    for filename in filenames:
+        name = path.basename(filename)
+        try:
+            config, evaluator = load_problem(filename, graph_length)
+            parent = create_parent(config, evaluator, seed)
+        except Exception as e:
+            print name, 'SKIPPED', repr(e)
+            continue
+        timings = {'active': len(parent.active),
+                   'graph_length': config['graph_length']}
+        for bench_name, bench in benchmarks:
+            if names is not None and bench_name not in names:
+                continue
+            create = lambda: bench(config, evaluator,
+                                   create_parent(config, evaluator, seed))
+            try:
+                timing = measure(create, seed, repeat, min_time)
+            except Exception as e:
+                print name, bench_name, 'FAILED', repr(e)
+                continue
+            if timing is not None:
+                print name, bench_name, '%.3g' % timing['best']
+                timings[bench_name] = timing
+        results[name] = timings
+    return results
+
+
+def run_corpus(filename, seed=0, repeat=5, min_time=0.2):
+    '''
+    Times ``get_fitness`` on every genome in a corpus created by
+    ``corpus.py``, returning a dictionary of results in the same form as
+    ``run_benchmarks``.
+    '''
+    import corpus
+    results = {}
+    for entry in corpus.load(filename):
+        name = 'corpus %s %s %s' % (entry['source'], entry['run'],
+                                    entry['stage'])
+        evaluator, config = corpus.create_evaluator(entry)
+        individual = corpus.create_individual(entry, config)
+        create = lambda: lambda: evaluator.get_fitness(individual)
+        timing = measure(create, seed, repeat, min_time)
+        print name, 'get_fitness', '%.3g' % timing['best']
+        results[name] = {'active': len(individual.active),
+                         'graph_length': individual.graph_length,
+                         'get_fitness': timing}
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''
+    Prints how the ``best`` time of each benchmark compares to the same
+    benchmark in ``baseline``.  Returns the list of (configuration,
+    benchmark) pairs which were slower by more than ``tolerance``.
+    '''
+    slower = []
+    print '%-18s %-28s %10s %10s' % ('Configuration', 'Benchmark',
+                                     'Baseline', 'Current')
+    for name, timings in sorted(results.items()):
+        for bench_name, timing in sorted(timings.items()):
+            try:
+                previous = baseline[name][bench_name]['best']
+                ratio = timing['best'] / previous
+            except (KeyError, TypeError):
+                continue
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = 'SLOWER'
+                slower.append((name, bench_name))
+            elif ratio < 1 - tolerance:
+                flag = 'faster'
+            print '%-18s %-28s %10.3g %10.3g %6.2fx %s' % (
+                name, bench_name, previous, timing['best'], ratio, flag)
+    return slower
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Time the most frequently used methods of Individual.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('configs', metavar='Configuration Files', type=str,
+                        nargs='*', help='The problem configurations to use,' +
+                        ' defaulting to all of those in cfg/')
+    parser.add_argument('-benchmarks', dest='benchmarks', type=str,
+                        nargs='+', choices=[name for name, _ in benchmarks],
+                        help='Which benchmarks to perform.')
+    parser.add_argument('-seed', dest='seed', type=int, default=0,
+                        help='The random seed used to create individuals.')
+    parser.add_argument('-repeat', dest='repeat', type=int, default=5,
+                        help='How many times to repeat each measurement.')
+    parser.add_argument('-min_time', dest='min_time', type=float,
+                        default=0.2, help='The minimum number of seconds' +
+                        ' each measurement should take.')
+    parser.add_argument('-g', dest='graph_length', type=int,
+                        help='Override the number of nodes in each problem.')
+    parser.add_argument('-corpus', dest='corpus', type=str,
+                        help='Also time get_fitness on each genome in' +
+                        ' this corpus.')
+    parser.add_argument('-out', dest='output', type=str,
+                        help='Write the results to this file.')
+    parser.add_argument('-baseline', dest='baseline', type=str,
+                        help='Compare the results to this file.')
+    parser.add_argument('-tolerance', dest='tolerance', type=float,
+                        default=0.1, help='The fraction slower a benchmark' +
+                        ' can be than the baseline before it is reported.')
+    args = parser.parse_args()
+
+    filenames = args.configs
+    if not filenames:
+        directory = path.join(path.dirname(path.abspath(__file__)), 'cfg')
+        filenames = [filename for filename in
+                     sorted(glob(path.join(directory, '*.cfg')))
+                     if path.basename(filename) not in not_problems]
+    results = run_benchmarks(filenames, args.benchmarks, args.seed,
+                             args.repeat, args.min_time, args.graph_length)
+    if args.corpus != None:
+        results.update(run_corpus(args.corpus, args.seed, args.repeat,
+                                  args.min_time))
+    output = {'python': sys.version,
+              'seed': args.seed,
+              'graph_length': args.graph_length,
+              'results': results}
+    if args.output != None:
+        util.save_configuration(args.output, output)
+    if args.baseline != None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+        slower = compare(results, baseline, args.tolerance)
+        if slower:
+            print len(slower), 'benchmarks were slower than the baseline'
+            sys.exit(1)
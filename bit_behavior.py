@@ -8,36 +8,44 @@ Use this module as an executable to process each problem's results:
 Note: Do not mix results from different problems.
 '''
 
-import json
 import sys
 from os import path
 from collections import defaultdict
-from util import find_median, open_file_method, pretty_name
+from util import find_median, pretty_name
+from pipeline import Stage, run
 
+# which statistics to pull out of the files
+interesting = [
+ 'active_nodes_changed',  # How many nodes that were active before and after the mutation changed behavior at least 1 bit
+ 'reactivated_nodes',  # How many nodes did active -> inactive -> active
+ 'inactive_bits_changed',  # For nodes that were active -> inactive -> active, how many bits changed in the process
+]
 
 
-if __name__ == '__main__':
-    filecount = 0
-    # which statistics to pull out of the files
-    interesting = [
-     'active_nodes_changed',  # How many nodes that were active before and after the mutation changed behavior at least 1 bit
-     'reactivated_nodes',  # How many nodes did active -> inactive -> active
-     'inactive_bits_changed',  # For nodes that were active -> inactive -> active, how many bits changed in the process
-    ]
+class BitBehavior(Stage):
+    '''
+    Analysis stage which collects the semantic change statistics of a single
+    problem.
+    '''
+    fields = [(1, test) for test in interesting]
+    group = 1
+
+    def __init__(self):
+        self.filecount = 0
+        self.combined = defaultdict(lambda: defaultdict(list))
 
-    # Collect information from the files
-    combined = defaultdict(lambda: defaultdict(list))
-    for filename in sys.argv[1:]:
+    def add(self, filename, data):
+        '''
+        Collect the statistics from a single file.
+        '''
         base = path.basename(filename)
         try:
             print 'Processing file', filename
-            with open_file_method(filename)(filename, 'r') as f:
-                data = json.load(f)
             # Converts the filename into a key
             version = tuple(base.split('_')[1:3])
             # extract each statistic
             for test in interesting:
-                result = data[1][test]
+                result = data[1, test]
                 try:
                     percentage = result['0'] / float(sum(result.values()))
                 except KeyError:
@@ -45,20 +53,30 @@ if __name__ == '__main__':
                 # Inverts to become inactive_bits_unchnaged
                 if test == 'inactive_bits_changed':
                     percentage = 1 - percentage
-                combined[version][test].append(percentage * 100)
-            filecount += 1
+                self.combined[version][test].append(percentage * 100)
+            self.filecount += 1
         except ValueError:
             print filename, "FAILED"
-    print "Loaded", filecount
-    # Finds the median results for each of the statistics
-    for version, table in combined.items():
-        for test, line in sorted(table.items()):
-            combined[version][test] = find_median(line)
-    # print the information in sorted order based on the first key
-    for version in sorted(combined.keys(), key=lambda version: combined[version][interesting[0]]):
-        duplicate, ordering = version
-        duplicate = ('\emph{%s}' % pretty_name[duplicate]).rjust(18)
-        ordering = ('\emph{%s}' % pretty_name[ordering]).rjust(14)
-        # LaTeX formatting
-        print ' & '.join([duplicate, ordering] + ["{0:.2f}\%".format(combined[version][test])
-                                                  for test in interesting]) + ' \\\\ \hline'
+
+    def finish(self):
+        '''
+        Print the median of each statistic as the rows of Table VI.
+        '''
+        combined = self.combined
+        print "Loaded", self.filecount
+        # Finds the median results for each of the statistics
+        for version, table in combined.items():
+            for test, line in sorted(table.items()):
+                combined[version][test] = find_median(line)
+        # print the information in sorted order based on the first key
+        for version in sorted(combined.keys(), key=lambda version: combined[version][interesting[0]]):
+            duplicate, ordering = version
+            duplicate = ('\emph{%s}' % pretty_name[duplicate]).rjust(18)
+            ordering = ('\emph{%s}' % pretty_name[ordering]).rjust(14)
+            # LaTeX formatting
+            print ' & '.join([duplicate, ordering] + ["{0:.2f}\%".format(combined[version][test])
+                                                      for test in interesting]) + ' \\\\ \hline'
+
+
+if __name__ == '__main__':
+    run([BitBehavior()], sys.argv[1:])
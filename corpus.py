@@ -0,0 +1,225 @@
+'''
+Creates a corpus of evolved genomes from the recorded bests of previous
+runs, giving benchmarks and correctness checks a realistic workload.
+Genomes found early, midway and late in each run are included, along with
+the test inputs and problem configuration needed to evaluate them again.
+Use this module as an executable to create a corpus from runs which used
+``-record_bests``:
+
+``python corpus.py corpus.json.gz final/*.dat.gz``
+
+and to check that evaluating every genome in the corpus gives the fitness
+it was recorded with:
+
+``python corpus.py -replay corpus.json.gz``
+
+The problem configuration is found using the problem name in each result
+file's name, for example ``cfg/parity.cfg``.  Use ``-problem`` to specify it
+for files not named in that way.
+'''
+
+import json
+import random
+from os import path
+from collections import defaultdict
+from timeit import default_timer
+from evolution import Individual
+from history import get_best
+import problems
+import util
+
+# Increased whenever the layout of a corpus changes
+version = 1
+
+# How far through a run's recorded bests each stage's genome comes from
+stages = [('early', 0.1), ('mid', 0.5), ('late', 1.0)]
+
+
+def stage_indices(length):
+    '''
+    Returns a list of (stage name, best index) pairs for a run which recorded
+    ``length`` bests.
+    '''
+    return [(name, int(round(fraction * (length - 1))))
+            for name, fraction in stages]
+
+
+def problem_config(filename, problem_file=None, directory='cfg'):
+    '''
+    Returns the configuration used by the problem of a result file,
+    combined with ``once.cfg``.
+
+    Parameters:
+
+    - ``filename``: The result file, named as described by
+      ``util.parse_filename``.
+    - ``problem_file``: If given, the problem configuration to use instead of
+      finding it from ``filename``.
+    - ``directory``: The folder containing the configuration files.
+    '''
+    settings = {}
+    try:
+        settings = util.parse_filename(filename)
+    except ValueError:
+        if problem_file is None:
+            raise
+    if problem_file is None:
+        problem_file = path.join(directory, settings['problem'] + '.cfg')
+    config = util.load_configurations([path.join(directory, 'once.cfg'),
+                                       problem_file])
+    if 'genome_size' in settings:
+        config['graph_length'] = settings['genome_size']
+        config['ordering'] = settings['ordering']
+        config['duplicate'] = settings['duplication']
+    return config
+
+
+def extract(filenames, per_group=None, problem_file=None, directory='cfg',
+            seed=0):
+    '''
+    Returns a corpus dictionary containing the genomes extracted from the
+    result files.  Files are grouped by their problem, duplication and
+    ordering, and at most ``per_group`` runs are used from each group.
+    Files which cannot be used are reported and skipped.
+
+    Parameters:
+
+    - ``filenames``: The list of result files to extract from.
+    - ``per_group``: If given, the most runs to use from each group, chosen
+      at random using ``seed``.
+    - ``problem_file``: Passed on to ``problem_config``.
+    - ``directory``: Passed on to ``problem_config``.
+    - ``seed``: The random seed used to choose runs.
+    '''
+    grouped = defaultdict(list)
+    for filename in filenames:
+        try:
+            data = util.load_list(filename)
+            config = problem_config(filename, problem_file, directory)
+        except (ValueError, IOError, KeyError) as e:
+            print filename, "FAILED", repr(e)
+            continue
+        for run, result in enumerate(data[1:], 1):
+            if not result.get('bests'):
+                continue
+            key = (config['problem'], config.get('duplicate'),
+                   config.get('ordering'))
+            grouped[key].append((filename, run, config, result))
+    chooser = random.Random(seed)
+    entries = []
+    for key, runs in sorted(grouped.items()):
+        if per_group is not None and len(runs) > per_group:
+            runs = chooser.sample(runs, per_group)
+        for filename, run, config, result in runs:
+            bests = result['bests']
+            for stage, index in stage_indices(len(bests)):
+                best = util.unpack_genome(get_best(bests, index))
+                entries.append({'source': path.basename(filename),
+                                'run': run,
+                                'stage': stage,
+                                'config': config,
+                                'test_inputs': result['test_inputs'],
+                                'best': best})
+    return {'version': version, 'entries': entries}
+
+
+def load(filename):
+    '''
+    Returns the list of entries in a corpus file.  Raises ``ValueError`` if
+    the corpus was created by an incompatible version of this module.
+    '''
+    with util.open_file_method(filename)(filename, 'r') as f:
+        corpus = json.load(f)
+    if corpus.get('version') != version:
+        raise ValueError('Unsupported corpus version %s' %
+                         corpus.get('version'))
+    return corpus['entries']
+
+
+def create_evaluator(entry):
+    '''
+    Returns the problem object used to evaluate the genome of a corpus entry,
+    as well as its configuration with the function list set.
+    '''
+    config = dict(entry['config'])
+    evaluator = problems.__dict__[config['problem']](config)
+    config['function_list'] = evaluator.operators
+    config['max_arity'] = evaluator.max_arity
+    return evaluator, config
+
+
+def create_individual(entry, config):
+    '''
+    Returns the ``Individual`` stored in a corpus entry, ready to be
+    evaluated.
+    '''
+    best = entry['best']
+    settings = dict(config)
+    settings.update(graph_length=best['graph_length'],
+                    input_length=best['input_length'],
+                    output_length=best['output_length'])
+    individual = Individual(**settings)
+    individual.load(best)
+    if config.get('ordering') == 'dag':
+        Individual.dag_determine_active_nodes(individual)
+    else:
+        Individual.determine_active_nodes(individual)
+    return individual
+
+
+def replay(entries, repeat=1):
+    '''
+    Evaluates every genome in the corpus, yielding the entry, the fitness
+    found, and the fastest time in seconds needed to find it.
+
+    Parameters:
+
+    - ``entries``: The entries of a corpus, as returned by ``load``.
+    - ``repeat``: How many times to time each evaluation.
+    '''
+    for entry in entries:
+        evaluator, config = create_evaluator(entry)
+        times = []
+        for _ in range(repeat):
+            individual = create_individual(entry, config)
+            start = default_timer()
+            fitness = evaluator.get_fitness(individual)
+            times.append(default_timer() - start)
+        yield entry, fitness, min(times)
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Create or replay a corpus of evolved genomes.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('corpus', type=str,
+                        help='The corpus file to create or replay.')
+    parser.add_argument('filenames', metavar='Result Files', type=str,
+                        nargs='*', help='The result files to extract from.')
+    parser.add_argument('-replay', dest='replay', action='store_true',
+                        help='Evaluate the genomes in an existing corpus.')
+    parser.add_argument('-repeat', dest='repeat', type=int, default=1,
+                        help='How many times to time each replay.')
+    parser.add_argument('-per_group', dest='per_group', type=int,
+                        help='The most runs to use from each problem,' +
+                        ' duplication and ordering.')
+    parser.add_argument('-problem', dest='problem_file', type=str,
+                        help='The problem configuration of all files.')
+    parser.add_argument('-seed', dest='seed', type=int, default=0,
+                        help='The random seed used to choose runs.')
+    args = parser.parse_args()
+
+    if args.replay:
+        mismatched = 0
+        for entry, fitness, seconds in replay(load(args.corpus),
+                                              args.repeat):
+            recorded = entry['best']['fitness']
+            status = 'ok' if fitness == recorded else 'MISMATCH'
+            mismatched += fitness != recorded
+            print entry['source'], entry['run'], entry['stage'],
+            print fitness, '%.3g' % seconds, status
+        print 'Mismatched', mismatched
+    else:
+        corpus = extract(args.filenames, args.per_group, args.problem_file,
+                         seed=args.seed)
+        print 'Extracted', len(corpus['entries']), 'genomes'
+        util.save_configuration(args.corpus, corpus)
@@ -4,7 +4,9 @@ Handles how to perform all of the actual evolution.
 import random
 import sys
 from copy import copy
-from util import diff_count, bitcount
+from hashlib import sha1
+from util import diff_count, bitcount, pack_genome, unpack_genome
+from memo import bitwise_versions
 import itertools
 from collections import defaultdict
 import problems
@@ -37,6 +39,9 @@ class Individual(object):
         self.genes = None
         self.genes = [self.random_gene(index) for index in
                       range(graph_length * self.node_step + output_length)]
+        # List of (gene index, old value) pairs for each gene changed since
+        # this individual was copied, or None if not known
+        self.changes = None
         self.determine_active_nodes()
         # Block of memory used when evaluating an individual
         self.scratch = [None] * (graph_length + self.input_length)
@@ -178,10 +183,12 @@ class Individual(object):
         # WARNING individuals are shallow copied except for things added here
         new = copy(self)
         new.genes = list(self.genes)
-        new.semantics = list(self.semantics)
-        new.never_active = list(self.never_active)
+        # Slicing keeps the storage type used by ``memory.bound_individual``
+        new.semantics = self.semantics[:]
+        new.never_active = self.never_active[:]
+        new.changes = []
         modification_method(new, *args, **kwargs)
-        new.determine_active_nodes()
+        new.update_active_nodes()
         return new
 
     def connections(self, node_index):
@@ -210,6 +217,95 @@ class Individual(object):
                 self.active.update(self.connections(node_index))
         self.active = sorted([acting for acting in self.active if acting >= 0])
 
+    def update_active_nodes(self):
+        '''
+        Updates the active nodes after the genes listed in ``changes`` were
+        modified.  The active nodes are only determined again if a change
+        could alter which nodes are active, meaning an output gene or a
+        connection gene of an active node changed.  Otherwise ``active`` is
+        left as the same list as the individual this was copied from.
+        '''
+        # Only look for changes to active nodes when it is likely none will
+        # be found, as most changes to large genomes hit some active node
+        if (self.changes is not None and
+            len(self.changes) * len(self.active) < 2 * self.graph_length):
+            active = set(self.active)
+            for index, _ in self.changes:
+                node_number = index // self.node_step
+                if (node_number >= self.graph_length or
+                    (index % self.node_step and node_number in active)):
+                    break
+            else:
+                return
+        self.determine_active_nodes()
+
+    # Not replaced by ``override_methods``, so methods which replace
+    # ``update_active_nodes`` can still use it
+    track_active_nodes = update_active_nodes
+
+    def update_depths(self):
+        '''
+        Replaces ``update_active_nodes`` when using the ``Depth`` problem
+        without bookkeeping.  ``depths`` is kept up to date with the value
+        ``lean_evaluate`` gives each active node when every input is 0, and
+        ``depth`` with the value of the first output.  Using ``changes``, only
+        nodes whose genes changed, which were not active before, or which
+        take input from a node whose value changed are calculated again.
+        '''
+        previous = self.active
+        self.track_active_nodes()
+        active = self.active
+        genes = self.genes
+        node_step = self.node_step
+        if (self.changes is None or
+            self.__dict__.get('depth_of') is not previous):
+            # Input locations, stored at the end, always have the value 0
+            depths = [0] * (self.graph_length + self.input_length)
+            dirty = set(active)
+            known = ()
+        else:
+            # Only the nodes active in ``previous`` have a known value
+            known = set(previous)
+            modified = {index // node_step for index, _ in self.changes}
+            if active is previous:
+                dirty = modified & known
+            else:
+                current = set(active)
+                dirty = (modified & current) | (current - known)
+            depths = self.depths[:] if dirty else self.depths
+        # Nodes whose value differs from the one stored in ``depths``
+        changed = set()
+        if dirty:
+            for node_index in active:
+                node_start = node_index * node_step
+                connections = genes[node_start + 1:node_start + node_step]
+                if node_index in dirty or not changed.isdisjoint(connections):
+                    value = genes[node_start](*[depths[conn]
+                                                for conn in connections])
+                    if value != depths[node_index] or node_index not in known:
+                        changed.add(node_index)
+                        depths[node_index] = value
+        self.depths = depths
+        self.depth_of = active
+        self.depth = depths[genes[-self.output_length]]
+
+    def count_input_connections(self):
+        '''
+        Replaces ``update_active_nodes`` when using the ``Flat`` problem.
+        All nodes are always active, and ``input_connections`` is kept up to
+        date with the number of connection genes connected to an input,
+        using ``changes`` where possible.
+        '''
+        if self.changes is None or 'input_connections' not in self.__dict__:
+            self.all_active()
+            self.input_connections = sum(isinstance(gene, int) and gene < 0
+                                         for gene in self.genes)
+            return
+        for index, old in self.changes:
+            gene = self.genes[index]
+            self.input_connections += ((isinstance(gene, int) and gene < 0) -
+                                       (isinstance(old, int) and old < 0))
+
     def dag_determine_active_nodes(self):
         '''
         Determines which nodes are currently active and sets self.active
@@ -299,6 +395,65 @@ class Individual(object):
         return [self.scratch[output]
                 for output in self.genes[-self.output_length:]]
 
+    # Kept so ``evaluate`` can be restored after being overridden
+    tracked_evaluate = evaluate
+
+    def lean_evaluate(self, inputs):
+        '''
+        Given a list of inputs, return a list of outputs from executing
+        this individual without recording semantics or never active
+        information.  Replaces ``evaluate`` when analysis bookkeeping is
+        disabled.
+
+        Parameters:
+
+        - ``inputs``: The list of input values for the individual to process.
+        '''
+        scratch = self.scratch
+        genes = self.genes
+        node_step = self.node_step
+        scratch[-len(inputs):] = inputs[::-1]
+        for node_index in self.active:
+            start = node_index * node_step
+            scratch[node_index] = genes[start](*[scratch[con] for con in
+                                                 genes[start + 1:
+                                                       start + node_step]])
+        return [scratch[output] for output in genes[-self.output_length:]]
+
+    def packed_evaluate(self, input_semantics, lookup, semantics=None):
+        '''
+        Evaluates this individual on every test input at once, with the
+        outputs of each node on all test inputs stored as the bits of its
+        semantic.  Records semantics and never active information in the
+        same way as ``evaluate``.  Returns the list of output semantics.
+
+        Parameters:
+
+        - ``input_semantics``: List of semantics for each input location,
+          such that ``input_semantics[-1]`` is the semantic of input
+          location -1.
+        - ``lookup``: Function which, given a node's function and the
+          semantics of its two inputs, returns the node's semantic, such as
+          ``memo.SemanticMemo.lookup``.
+        - ``semantics``: Optional list to store the node semantics in
+          instead of ``self.semantics``, for instance when only some of the
+          test inputs are being evaluated.
+        '''
+        if semantics is None:
+            semantics = self.semantics
+        for index in range(-self.input_length, 0):
+            semantics[index] = input_semantics[index]
+        genes = self.genes
+        node_step = self.node_step
+        never_active = self.never_active
+        for node_index in self.active:
+            start = node_index * node_step
+            semantics[node_index] = lookup(genes[start],
+                                           semantics[genes[start + 1]],
+                                           semantics[genes[start + 2]])
+            never_active[node_index] = False
+        return [semantics[output] for output in genes[-self.output_length:]]
+
     def mutate(self, mutation_rate):
         '''
         Mutates the calling individual's genes using the give mutation rate.
@@ -307,9 +462,15 @@ class Individual(object):
 
         - ``mutation_rate``: The probability that a specific gene will mutate.
         '''
-        for index in range(len(self.genes)):
-            if random.random() < mutation_rate:
-                self.genes[index] = self.random_gene(index, self.genes[index])
+        genes = self.genes
+        changes = self.changes
+        # Local lookup is faster but uses the same random number sequence
+        rand = random.random
+        for index in xrange(len(genes)):
+            if rand() < mutation_rate:
+                if changes is not None:
+                    changes.append((index, genes[index]))
+                genes[index] = self.random_gene(index, genes[index])
 
     def one_active_mutation(self, _):
         '''
@@ -322,6 +483,8 @@ class Individual(object):
             newval = self.random_gene(index, self.genes[index])
             # If that value is different than the current value
             if newval != self.genes[index]:
+                if self.changes is not None:
+                    self.changes.append((index, self.genes[index]))
                 self.genes[index] = newval
                 # Determine if that gene was part of an active node
                 node_number = index // self.node_step
@@ -332,7 +495,8 @@ class Individual(object):
     def reorder(self):
         '''
         Reorder individual's genes randomly without
-        changing any of the actual connection information.
+        changing any of the actual connection information.  Returns the
+        dictionary mapping each old node index to its new index.
         '''
         # Build a list of dependencies
         depends_on = defaultdict(set)
@@ -363,8 +527,21 @@ class Individual(object):
                 depends_on[to_add].remove(working)
                 if len(depends_on[to_add]) == 0:
                     addable.append(to_add)
+        self.apply_order(new_order)
+        self.determine_active_nodes()
+        return new_order
 
-        # Create the new individual using the new ordering
+    def apply_order(self, new_order):
+        '''
+        Moves every node to a new index without changing any of the actual
+        connection information.  Does not update the active nodes.
+
+        Parameters:
+
+        - ``new_order``: Dictionary mapping each old node index, including
+          input locations, to its new index.
+        '''
+        self.changes = None
         old_genes = copy(self.genes)
         old_semantics = copy(self.semantics)
         old_n_a = copy(self.never_active)
@@ -387,7 +564,6 @@ class Individual(object):
         # Update the output locations
         for index in range(length - self.output_length, length):
             self.genes[index] = new_order[old_genes[index]]
-        self.determine_active_nodes()
 
     def simplify(self):
         '''
@@ -411,6 +587,7 @@ class Individual(object):
                     self.genes[index] = lookup[semantic]
                 except KeyError:
                     pass
+        self.changes = None
         self.determine_active_nodes()
 
     def asym_phenotypic_difference(self, other):
@@ -436,6 +613,78 @@ class Individual(object):
                       other.genes[index])
         return count
 
+    def semantic_duplicate(self, parent, functions, mask):
+        '''
+        Determines if this individual, an offspring of ``parent``, produces
+        exactly the same outputs as ``parent`` on every test input.  Only
+        nodes whose genes changed, which were inactive in ``parent``, or
+        which take input from a node whose semantic changed are recalculated,
+        using bitwise versions of their functions.  Recalculated semantics
+        and never active information are stored, leaving the individual as if
+        it had been evaluated.  Requires ``parent`` to have been evaluated on
+        every test input with semantics recorded.
+
+        Parameters:
+
+        - ``parent``: The individual this individual was copied from.
+        - ``functions``: Dictionary mapping each function to its bitwise
+          version, as returned by ``memo.bitwise_versions``.
+        - ``mask``: Integer with one bit set for each test input.
+        '''
+        genes = self.genes
+        parent_genes = parent.genes
+        semantics = self.semantics
+        parent_semantics = parent.semantics
+        node_step = self.node_step
+        parent_active = set(parent.active)
+        # Nodes whose semantic differs from the parent's
+        changed = set()
+        for node_index in self.active:
+            start = node_index * node_step
+            end = start + node_step
+            if (node_index in parent_active and
+                genes[start:end] == parent_genes[start:end] and
+                not changed.intersection(genes[start + 1:end])):
+                continue
+            semantic = functions[genes[start]](semantics[genes[start + 1]],
+                                               semantics[genes[start + 2]],
+                                               mask)
+            semantics[node_index] = semantic
+            self.never_active[node_index] = False
+            if semantic != parent_semantics[node_index]:
+                changed.add(node_index)
+        return all(semantics[gene] == parent_semantics[old]
+                   for gene, old in zip(genes[-self.output_length:],
+                                        parent_genes[-self.output_length:]))
+
+    def canonical_hash(self):
+        '''
+        Returns a hash of the individual's active graph which does not depend
+        on how the nodes are numbered.  Each active node is described by its
+        function and the descriptions of the locations it takes input from,
+        sorted for functions in ``problems.commutative``, and the
+        individual by the descriptions of its output locations.  Individuals
+        with the same hash compute the same function of their inputs using
+        the same structure, except that identical nodes are treated as one.
+        '''
+        genes = self.genes
+        node_step = self.node_step
+        described = {index: 'i%d' % index
+                     for index in range(-self.input_length, 0)}
+        # Nodes are described after all of the nodes they take input from
+        for node_index in self.active:
+            start = node_index * node_step
+            function = genes[start]
+            name = getattr(function, '__name__', str(function))
+            inputs = [described[conn]
+                      for conn in genes[start + 1:start + node_step]]
+            if name in problems.commutative:
+                inputs.sort()
+            described[node_index] = sha1(name + '(' + ','.join(inputs) +
+                                         ')').hexdigest()
+        return sha1(','.join(described[output] for output in
+                             genes[-self.output_length:])).hexdigest()
+
     def show_active(self):
         '''
         Prints the active portions of the individual in a somewhat readable
@@ -466,28 +715,42 @@ class Individual(object):
         return [g if isinstance(g, int) else g.__name__
                 for g in self.genes]
 
-    def dump(self):
+    def dump(self, compact=False):
         '''
         Returns a json ready dictionary representation of the entire individual
+
+        Parameters:
+
+        - ``compact``: If True, genes and never active information are stored
+          using ``util.pack_genome``.
         '''
         genes = self.dump_genes()
         never_active = ''.join(str(int(x)) for x in self.never_active)
-        return {'genes': genes,
+        data = {'genes': genes,
                 'fitness': self.fitness,
                 'never_active': never_active,
                 'graph_length': self.graph_length,
                 'max_arity': self.node_step - 1,
                 'output_length': self.output_length,
                 'input_length': self.input_length}
+        if compact:
+            return pack_genome(data)
+        return data
 
     def load(self, data):
         '''
         Recovers a "dump"ed individual from the dictionary,
-        overwriting the calling individual.
+        overwriting the calling individual.  Accepts both the normal and
+        compact formats.
         '''
+        data = unpack_genome(data)
         self.__dict__.update(data)
+        self.changes = None
         self.never_active = [x == '1' for x in data['never_active']]
-        self.genes = [g if isinstance(g, int) else problems.__dict__[g]
+        # Look up each function only once
+        functions = {g: problems.__dict__[g] for g in set(self.genes)
+                     if not isinstance(g, int)}
+        self.genes = [g if isinstance(g, int) else functions[g]
                       for g in self.genes]
 
     @staticmethod
@@ -518,7 +781,69 @@ class Individual(object):
         return individual
 
 
-def generate(config, output, frequencies):
+def override_methods(config):
+    '''
+    Replaces methods of ``Individual`` with the variants required by the
+    configuration's ``ordering``, ``duplicate``, ``problem`` and
+    ``bookkeeping`` settings.
+    '''
+    if config['ordering'] == 'dag':
+        # Override base functions with dag versions
+        Individual.determine_active_nodes = \
+        Individual.dag_determine_active_nodes
+        Individual.random_gene = \
+        Individual.dag_random_gene
+    if config['duplicate'] == 'single':
+        # Override normal mutation with Single
+        Individual.mutate = Individual.one_active_mutation
+    Individual.update_active_nodes = Individual.track_active_nodes
+    if config['problem'] == 'Flat':
+        # Override normal method for determining active genes
+        Individual.determine_active_nodes = Individual.all_active
+        Individual.update_active_nodes = Individual.count_input_connections
+    if config.get('bookkeeping', 'full') == 'none':
+        # Override evaluation with the version without bookkeeping
+        Individual.evaluate = Individual.lean_evaluate
+        if config['problem'] == 'Depth':
+            # Keeps the depth of every node up to date during mutation
+            Individual.update_active_nodes = Individual.update_depths
+    else:
+        Individual.evaluate = Individual.tracked_evaluate
+
+
+def record_changes(output, parent, best_child):
+    '''
+    Records how the semantics of nodes changed when ``best_child`` replaced
+    ``parent``, updating the ``inactive_bits_changed``,
+    ``reactivated_nodes``, ``active_nodes_changed``, ``active_bits_changed``
+    and ``child_replaced_parent`` values of ``output``.  See ``generate``.
+    '''
+    parent_active = set(parent.active)
+    re_active = 0
+    active_changed = 0
+    for newly_active in best_child.active:
+        if parent.never_active[newly_active]:
+            # You can't get change information if its never
+            # been evaluated before.
+            continue
+        # Determine how the semantics have changed
+        prev = parent.semantics[newly_active]
+        now = best_child.semantics[newly_active]
+        change = bitcount(now ^ prev)
+        if newly_active in parent_active:
+            if change > 0:
+                active_changed += 1
+                output['active_bits_changed'][change] += 1
+        else:
+            # Was inactive in parent
+            re_active += 1
+            output['inactive_bits_changed'][change] += 1
+    output['reactivated_nodes'][re_active] += 1
+    output['active_nodes_changed'][active_changed] += 1
+    output['child_replaced_parent'] += 1
+
+
+def generate(config, output, frequencies, timer=None, lineage=None):
     '''
     An ``Individual`` generator that will yield a never ending supply of
     ``Individual`` objects that need to have their fitness set before the
@@ -538,14 +863,43 @@ def generate(config, output, frequencies):
       - ``output_length``: The number of output variables.
       - ``max_arity``: The maximum arity used by any function.
       - ``duplicate``: String specifying the way to handle duplicate
-        individual creation, either ``normal'', ``skip'', ``accumulate``, or
-        ``single``.
+        individual creation, either ``normal'', ``skip'', ``accumulate``,
+        ``single``, ``semantic`` or ``canonical``.  ``semantic`` skips the
+        same offspring as ``skip``, as well as any offspring whose outputs
+        are the same as its parent's on every test input, which then inherit
+        the parent's fitness.  It requires ``full`` bookkeeping, functions
+        with bitwise versions in ``semantics.bit_functions`` and a problem
+        not in ``problems.structural``.
+        ``canonical`` skips the same offspring as ``skip``, as well as any
+        offspring with the same ``Individual.canonical_hash`` as an
+        individual already evaluated in this population, which then use
+        that individual's fitness.  It requires bookkeeping to be ``none``
+        and a problem not in ``problems.structural``.
+      - ``canonical_size``: Optional, with ``canonical`` duplicate
+        detection, how many fitnesses to remember before forgetting them
+        all.  Defaults to 100000.
       - ``problem``: The problem these individuals are solving.  Used on in
         the case where problems require unusual individual modification.
+      - ``bookkeeping``: Optional, how much analysis information to record,
+        either ``full`` (the default), ``none`` or ``sampled``.  With
+        ``none`` semantics, never active information and the semantic change
+        statistics are not recorded, and the change statistics are left out
+        of ``output``.  With ``sampled``, they are only
+        recorded for two consecutive generations out of every
+        ``bookkeeping_stride``, and the change statistics only include
+        parents replaced in the second of those generations.  As
+        ``Individual.evaluate`` is replaced every generation, ``sampled``
+        requires a ``pop_size`` of 1.
     - ``output``: Dictionary used to return information about evolution, will
       send out:
 
       - ``skipped``: The number of evaluations skipped by ``Skip``.
+      - ``semantic_skipped``: When ``duplicate`` is ``semantic``, the number
+        of evaluations skipped because the offspring's outputs were
+        unchanged, not including those counted by ``skipped``.
+      - ``canonical_skipped``: When ``duplicate`` is ``canonical``, the
+        number of evaluations skipped because the offspring's phenotype had
+        already been evaluated, not including those counted by ``skipped``.
       - ``estimated``: The estimated number of evaluations that are skippable.
       - ``inactive_bits_changed``: Keeps track of nodes that were active, became
         inactive, and have become active again, looking at how many bits in their
@@ -559,39 +913,87 @@ def generate(config, output, frequencies):
         node was changed by mutation but remained active.
       - ``child_replaced_parent``: Counts how often the parent is replaced by the offspring.
       - ``parent_not_replaced``: Counts how often no offspring in a generation replaced the parent.
+      - ``sampled_transitions``: When ``bookkeeping`` is ``sampled``, counts
+        how many parent replacements are included in the change statistics.
     - ``frequencies``:  Dictionary used to return information about how often
       individuals of different lengths are evolved.
+    - ``timer``: Optional ``util.PhaseTimer``.  If given, the time spent
+      reordering, copying, mutating, determining active nodes, checking for
+      duplicates and selecting the next parent is recorded.
+    - ``lineage``: Optional ``lineage.LineageWriter``.  If given, every
+      accepted parent is recorded.
     '''
     output['skipped'] = 0
     output['estimated'] = 0
-    output['inactive_bits_changed'] = defaultdict(int)
-    output['reactivated_nodes'] = defaultdict(int)
-    output['active_nodes_changed'] = defaultdict(int)
-    output['active_bits_changed'] = defaultdict(int)
     output['child_replaced_parent'] = 0
     output['parent_not_replaced'] = 0
-    if config['ordering'] == 'dag':
-        # Override base functions with dag versions
-        Individual.determine_active_nodes = \
-        Individual.dag_determine_active_nodes
-        Individual.random_gene = \
-        Individual.dag_random_gene
-    if config['duplicate'] == 'single':
-        # Override normal mutation with Single
-        Individual.mutate = Individual.one_active_mutation
-    if config['problem'] == 'Flat':
-        # Override normal method for determining active genes
-        Individual.determine_active_nodes = Individual.all_active
+    override_methods(config)
+    bookkeeping = config.get('bookkeeping', 'full')
+    if bookkeeping != 'none':
+        output['inactive_bits_changed'] = defaultdict(int)
+        output['reactivated_nodes'] = defaultdict(int)
+        output['active_nodes_changed'] = defaultdict(int)
+        output['active_bits_changed'] = defaultdict(int)
+    if bookkeeping == 'sampled':
+        if config['pop_size'] != 1:
+            raise ValueError('Sampled bookkeeping requires a pop_size of 1')
+        output['sampled_transitions'] = 0
+        stride = config.get('bookkeeping_stride', 100)
+        generation = 0
+        # If the parent's semantics were recorded when it was evaluated
+        fresh = True
+    if config['duplicate'] == 'semantic':
+        if bookkeeping != 'full':
+            raise ValueError('Semantic duplicate detection requires full'
+                             ' bookkeeping')
+        if config['problem'] in problems.structural:
+            raise ValueError('Semantic duplicate detection cannot be used'
+                             ' with ' + config['problem'])
+        output['semantic_skipped'] = 0
+        bitwise = bitwise_versions(config['function_list'])
+    if config['duplicate'] == 'canonical':
+        if bookkeeping != 'none':
+            raise ValueError('Canonical duplicate detection requires'
+                             ' bookkeeping to be none')
+        if config['problem'] in problems.structural:
+            raise ValueError('Canonical duplicate detection cannot be used'
+                             ' with ' + config['problem'])
+        output['canonical_skipped'] = 0
+        capacity = config.get('canonical_size', 100000)
+        # Maps the canonical hash of each evaluated individual to its fitness
+        evaluated = {}
     parent = Individual(**config)
     # Evaluate initial individual
     yield parent
+    if config['duplicate'] == 'canonical':
+        evaluated[parent.canonical_hash()] = parent.fitness
+    if lineage is not None:
+        population = lineage.add_population(parent)
     while True:
+        if bookkeeping == 'sampled':
+            tracked = generation % stride < 2
+            generation += 1
+            if tracked:
+                Individual.evaluate = Individual.tracked_evaluate
+            else:
+                Individual.evaluate = Individual.lean_evaluate
         if config['ordering'] == 'reorder':
+            if timer is not None:
+                timer.start()
             # Reorder the parent
-            parent.reorder()
+            new_order = parent.reorder()
+            if timer is not None:
+                timer.lap('reorder')
+            if lineage is not None:
+                lineage.reorder(population, new_order)
         # Create mutant offspring
-        mutants = [parent.new(Individual.mutate, config['mutation_rate'])
-                   for _ in range(config['off_size'])]
+        if timer is None:
+            mutants = [parent.new(Individual.mutate, config['mutation_rate'])
+                       for _ in range(config['off_size'])]
+        else:
+            mutants = [timer.new(parent, Individual.mutate,
+                                 config['mutation_rate'])
+                       for _ in range(config['off_size'])]
         # Determine how many active genes the parent has
         active = config['output_length'] + (len(parent.active) *
                                             (config['max_arity'] + 1))
@@ -600,59 +1002,92 @@ def generate(config, output, frequencies):
             output['estimated'] += (1 - config['mutation_rate']) ** active
             prev = mutant
             if config['duplicate'] not in ['normal', 'single']:
+                if timer is not None:
+                    timer.start()
                 change = parent.asym_phenotypic_difference(mutant)
+                if timer is not None:
+                    timer.lap('duplicate')
                 if change == 0:
                     output['skipped'] += 1
-                    if config['duplicate'] == 'skip':
+                    if config['duplicate'] in ['skip', 'semantic',
+                                               'canonical']:
                         continue
                     if config['duplicate'] == 'accumulate':
                         while change == 0:
                             # As long as there have been no changes,
                             # keep mutating
                             prev = mutant
-                            mutant = prev.new(Individual.mutate,
-                                              config['mutation_rate'])
+                            if timer is None:
+                                mutant = prev.new(Individual.mutate,
+                                                  config['mutation_rate'])
+                            else:
+                                mutant = timer.new(prev, Individual.mutate,
+                                                   config['mutation_rate'])
                             change = parent.asym_phenotypic_difference(mutant)
+                            if timer is not None:
+                                timer.lap('duplicate')
+            if config['duplicate'] == 'semantic':
+                if timer is not None:
+                    timer.start()
+                # Every test input has been seen by the parent's evaluation
+                mask = (1 << len(parent.input_order)) - 1
+                same = mutant.semantic_duplicate(parent, bitwise, mask)
+                if timer is not None:
+                    timer.lap('duplicate')
+                if same:
+                    # Inherits the parent's fitness from being copied
+                    output['semantic_skipped'] += 1
+                    continue
+            if config['duplicate'] == 'canonical':
+                if timer is not None:
+                    timer.start()
+                key = mutant.canonical_hash()
+                if timer is not None:
+                    timer.lap('duplicate')
+                if key in evaluated:
+                    mutant.fitness = evaluated[key]
+                    output['canonical_skipped'] += 1
+                    continue
             if 'frequency_results' in config:
                 # Records the length of the generated individual
                 frequencies[len(mutant.active)] += 1
             # Send the offspring out to be evaluated
             yield mutant
+            if config['duplicate'] == 'canonical':
+                if len(evaluated) >= capacity:
+                    evaluated.clear()
+                evaluated[key] = mutant.fitness
             if config['duplicate'] == 'accumulate':
                 # If the mutant is strickly worse, use the last equivalent
                 mutants[index] = prev if mutant < parent else mutant
+        if timer is not None:
+            timer.start()
         best_child = max(mutants)
         if parent <= best_child:
-            parent_active = set(parent.active)
-            re_active = 0
-            active_changed = 0
-            for newly_active in best_child.active:
-                if parent.never_active[newly_active]:
-                    # You can't get change information if its never
-                    # been evaluated before.
-                    continue
-                # Determine how the semantics have changed
-                prev = parent.semantics[newly_active]
-                now = best_child.semantics[newly_active]
-                change = bitcount(now ^ prev)
-                if newly_active in parent_active:
-                    if change > 0:
-                        active_changed += 1
-                        output['active_bits_changed'][change] += 1
-                else:
-                    # Was inactive in parent
-                    re_active += 1
-                    output['inactive_bits_changed'][change] += 1
-            output['reactivated_nodes'][re_active] += 1
-            output['active_nodes_changed'][active_changed] += 1
-            output['child_replaced_parent'] += 1
+            if bookkeeping == 'full':
+                record_changes(output, parent, best_child)
+            elif bookkeeping == 'sampled' and tracked and fresh:
+                record_changes(output, parent, best_child)
+                output['sampled_transitions'] += 1
+            else:
+                output['child_replaced_parent'] += 1
+            if bookkeeping == 'sampled':
+                fresh = tracked
+            if lineage is not None:
+                lineage.transition(population,
+                                   output['child_replaced_parent'] +
+                                   output['parent_not_replaced'],
+                                   parent, best_child)
             # Replace the parent with the child
             parent = best_child
         else:
             output['parent_not_replaced'] += 1
+        if timer is not None:
+            timer.lap('selection')
 
 
-def multi_indepenedent(config, output, frequencies):
+def multi_indepenedent(config, output, frequencies, timer=None,
+                       lineage=None):
     '''
     Allows for multiple parallel independent populations to be evolved
     at the same time.  Will generate one individual from each population
@@ -673,8 +1108,13 @@ def multi_indepenedent(config, output, frequencies):
     - ``frequencies``:  Dictionary used to return information about how often
       individuals of different lengths are evolved.  Shared by all parallel
       populations.  Will contain all information output by ``generate``.
+    - ``timer``: Optional ``util.PhaseTimer`` shared by all parallel
+      populations.
+    - ``lineage``: Optional ``lineage.LineageWriter`` shared by all parallel
+      populations.
     '''
-    collective = itertools.izip(*[generate(config, output, frequencies)
+    collective = itertools.izip(*[generate(config, output, frequencies, timer,
+                                           lineage)
                                   for _ in range(config['pop_size'])])
     for next_iterations in collective:
         for next_iteration in next_iterations:
@@ -0,0 +1,140 @@
+'''
+Handles compact storage of the best individuals recorded during a run.
+Successive bests usually differ in only a few genes, so instead of storing
+every ``Individual.dump`` in full, most bests are stored as the list of
+changes from the previous best.  A full "keyframe" is stored periodically
+so that any best can be recovered without replaying the whole run.
+
+Use ``expand_bests`` or ``get_best`` to recover the full ``dump`` of recorded
+bests.  Both also accept lists of full dumps, such as those produced before
+this encoding was introduced, and keyframes stored using
+``util.pack_genome``.
+'''
+from util import unpack_genome
+
+
+class BestHistory(object):
+    '''
+    Converts the sequence of best individuals found during a single run into
+    keyframes and deltas.
+    '''
+
+    def __init__(self, keyframe_frequency=50):
+        '''
+        Create a new empty history.
+
+        Parameters:
+
+        - ``keyframe_frequency``: How many bests are recorded between full
+          keyframes.  Using 1 causes every best to be stored in full.
+        '''
+        self.keyframe_frequency = keyframe_frequency
+        self.previous = None
+        self.since_keyframe = 0
+
+    def encode(self, dump):
+        '''
+        Returns the json ready record for storing ``dump``, which must be the
+        next best in the run.  Records are either the ``dump`` itself or a
+        delta containing:
+
+        - ``delta``: Always true, used to tell deltas apart from keyframes.
+        - ``genes``: List of ``[gene_index, new_value]`` pairs.
+        - ``never_active``: List of node indices whose never active status
+          changed.
+        - All other values in the ``dump`` that changed, such as ``fitness``
+          and ``evals``.
+
+        Parameters:
+
+        - ``dump``: The dictionary returned by ``Individual.dump``, which may
+          include extra information such as ``evals``.
+        '''
+        previous, self.previous = self.previous, dump
+        self.since_keyframe += 1
+        if (previous is None or
+            self.since_keyframe >= self.keyframe_frequency):
+            self.since_keyframe = 0
+            return dump
+        record = {'delta': True,
+                  'genes': [[index, gene] for index, (gene, old) in
+                            enumerate(zip(dump['genes'], previous['genes']))
+                            if gene != old],
+                  'never_active': [index for index, (bit, old) in
+                                   enumerate(zip(dump['never_active'],
+                                                 previous['never_active']))
+                                   if bit != old]}
+        # Store a keyframe if the delta would not actually save anything
+        if (len(record['genes']) * 2 > len(dump['genes']) or
+            len(record['never_active']) * 4 > len(dump['never_active'])):
+            self.since_keyframe = 0
+            return dump
+        for key, value in dump.iteritems():
+            if key not in ('genes', 'never_active') and (
+               key not in previous or previous[key] != value):
+                record[key] = value
+        return record
+
+
+def apply_delta(previous, record):
+    '''
+    Returns the full ``dump`` created by applying ``record`` to the full
+    ``dump`` of the previous best.  If ``record`` is a keyframe, it is
+    returned unchanged.
+
+    Parameters:
+
+    - ``previous``: The full ``dump`` of the best recorded before ``record``.
+    - ``record``: An entry created by ``BestHistory.encode``.
+    '''
+    if not record.get('delta', False):
+        return unpack_genome(record)
+    result = dict(previous)
+    genes = list(previous['genes'])
+    for index, gene in record['genes']:
+        genes[index] = gene
+    never_active = list(previous['never_active'])
+    for index in record['never_active']:
+        never_active[index] = '1' if never_active[index] == '0' else '0'
+    for key, value in record.iteritems():
+        if key not in ('delta', 'genes', 'never_active'):
+            result[key] = value
+    result['genes'] = genes
+    result['never_active'] = ''.join(never_active)
+    return result
+
+
+def expand_bests(bests):
+    '''
+    Generator that yields the full ``dump`` of every recorded best in order.
+
+    Parameters:
+
+    - ``bests``: The ``bests`` list from a run's results.
+    '''
+    current = None
+    for record in bests:
+        current = apply_delta(current, record)
+        yield current
+
+
+def get_best(bests, index):
+    '''
+    Returns the full ``dump`` of a single recorded best, only replaying deltas
+    since the closest preceding keyframe.
+
+    Parameters:
+
+    - ``bests``: The ``bests`` list from a run's results.
+    - ``index``: Which best to recover.  Negative values count from the end,
+      so -1 is the final best of the run.
+    '''
+    if index < 0:
+        index += len(bests)
+    if not 0 <= index < len(bests):
+        raise IndexError('best index out of range')
+    start = index
+    while bests[start].get('delta', False):
+        start -= 1
+    return reduce(apply_delta, bests[start + 1:index + 1],
+                  unpack_genome(bests[start]))
@@ -0,0 +1,250 @@
+'''
+Produces the confidence interval information displayed in Table II, and
+provides the statistical tests used by ``stats.py``.  Each test is
+computed for all groups at once using numpy instead of one group at a time.
+Use this module as an executable on either rdata.csv or an index built by
+``run_index.py``:
+
+``python interval.py rdata.csv``
+
+Results are grouped by problem, duplication, ordering, genome size and
+mutation rate, and displayed ordered by the problem and then the median
+number of evaluations.  Confidence intervals of the median are found by
+bootstrapping, using the normal approximation in the same way as R's
+``boot.ci(type="norm")``.  Use ``-resamples`` to control how many bootstrap
+samples are used for each group.
+'''
+
+import csv
+from collections import OrderedDict, namedtuple
+from multiprocessing import Pool
+import numpy as np
+from scipy.special import erfc, ndtri
+from scipy.stats import chi2, rankdata
+
+# The columns which define a group of runs
+group_columns = ['problem', 'duplication', 'ordering', 'genome_size',
+                 'mutation_rate']
+
+TestResult = namedtuple('TestResult', ['statistic', 'pvalue'])
+
+
+def read_rdata(filename):
+    '''
+    Returns an ordered dictionary mapping the group of each run in the
+    file created by ``make_rdata.py`` to the list of evaluations used by the
+    runs in that group.
+    '''
+    groups = OrderedDict()
+    with open(filename, 'r') as f:
+        for row in csv.DictReader(f):
+            try:
+                group = tuple(row[column] for column in group_columns)
+                groups.setdefault(group, []).append(int(row['evaluations']))
+            except (TypeError, ValueError):
+                # Lines reporting files which FAILED
+                continue
+    return groups
+
+
+def read_index(filename):
+    '''
+    Similar to ``read_rdata`` except it reads from an index built by
+    ``run_index.py``.
+    '''
+    from run_index import connect, select
+    groups = OrderedDict()
+    for row in select(connect(filename), group_columns + ['evals']):
+        group = tuple(str(value) for value in row[:-1])
+        groups.setdefault(group, []).append(row[-1])
+    return groups
+
+
+def tie_terms(counts):
+    '''
+    Returns ``k ** 3 - k`` for each count ``k`` of tied values, as used to
+    correct rank based tests for ties.
+    '''
+    counts = np.asarray(counts, dtype=np.float64)
+    return counts ** 3 - counts
+
+
+def kruskal_wallis(samples):
+    '''
+    Performs the Kruskal-Wallis H-test on a list of samples, which can each
+    be of different lengths.  Returns the statistic and p-value, with the
+    statistic corrected for ties.
+    '''
+    samples = [np.asarray(sample, dtype=np.float64) for sample in samples]
+    lengths = np.array([len(sample) for sample in samples])
+    values = np.concatenate(samples)
+    which = np.repeat(np.arange(len(samples)), lengths)
+    ranks = rankdata(values)
+    total = len(values)
+    rank_sums = np.bincount(which, weights=ranks, minlength=len(samples))
+    H = (12. / (total * (total + 1)) * (rank_sums ** 2 / lengths).sum()
+         - 3 * (total + 1))
+    ties = 1. - (tie_terms(np.unique(values, return_counts=True)[1]).sum()
+                 / float(total ** 3 - total))
+    if ties == 0:
+        raise ValueError('All numbers are identical in kruskal_wallis')
+    H /= ties
+    return TestResult(H, chi2.sf(H, len(samples) - 1))
+
+
+def mann_whitney_u(control, samples):
+    '''
+    Performs the Mann-Whitney U test comparing ``control`` against each of
+    the ``samples``, using the normal approximation with continuity
+    correction.  Returns the list of statistics and p-values, one for each
+    sample.
+    '''
+    control = np.sort(np.asarray(control, dtype=np.float64))
+    samples = [np.asarray(sample, dtype=np.float64) for sample in samples]
+    lengths = np.array([len(sample) for sample in samples])
+    values = np.concatenate(samples)
+    which = np.repeat(np.arange(len(samples)), lengths)
+    # For every value, how many control values are below or equal to it
+    below = np.searchsorted(control, values, side='left')
+    equal = np.searchsorted(control, values, side='right') - below
+    wins = np.bincount(which, weights=below + equal / 2.,
+                       minlength=len(samples))
+    nx, ny = len(control), lengths.astype(np.float64)
+    U = np.maximum(wins, nx * ny - wins)
+
+    # Each sample's ties, adjusting for values also found in the control
+    order = np.lexsort((values, which))
+    which, values = which[order], values[order]
+    starts = np.flatnonzero(np.concatenate(([True],
+                                            (np.diff(which) != 0) |
+                                            (np.diff(values) != 0))))
+    tied = np.diff(np.append(starts, len(values))).astype(np.float64)
+    in_control = (np.searchsorted(control, values[starts], side='right') -
+                  np.searchsorted(control, values[starts], side='left'))
+    adjust = tie_terms(tied + in_control) - tie_terms(in_control)
+    ties = (tie_terms(np.unique(control, return_counts=True)[1]).sum() +
+            np.bincount(which[starts], weights=adjust,
+                        minlength=len(samples)))
+
+    total = nx + ny
+    mu = nx * ny / 2.
+    sigsq = (total ** 3 - total) / 12. - ties / 12.
+    sigsq *= nx * ny / (total * (total - 1))
+    z = (U - 1 / 2. - mu) / np.sqrt(sigsq)
+    return [TestResult(statistic, pvalue) for statistic, pvalue in
+            zip(nx * ny - U, erfc(abs(z) / np.sqrt(2)))]
+
+
+def bootstrap_medians(values, resamples, random, block_size=1000000):
+    '''
+    Returns the median of each of ``resamples`` bootstrap samples of
+    ``values``.  Samples are created in blocks of at most ``block_size``
+    total values to bound memory usage.
+
+    Parameters:
+
+    - ``values``: The data to resample.
+    - ``resamples``: How many bootstrap samples to create.
+    - ``random``: The ``numpy.random.RandomState`` used to create samples.
+    - ``block_size``: Limits how many values are sampled at once.
+    '''
+    values = np.asarray(values)
+    per_block = max(1, block_size // len(values))
+    medians = []
+    for start in range(0, resamples, per_block):
+        count = min(per_block, resamples - start)
+        indices = random.randint(0, len(values), (count, len(values)))
+        medians.append(np.median(values[indices], axis=1))
+    return np.concatenate(medians)
+
+
+def median_interval(values, resamples=100, confidence=0.95, seed=None):
+    '''
+    Returns the lower bound, median and upper bound of the normal
+    approximation bootstrap confidence interval of the median of ``values``.
+
+    Parameters:
+
+    - ``values``: The data to find the median of.
+    - ``resamples``: How many bootstrap samples to use.
+    - ``confidence``: The confidence level of the interval.
+    - ``seed``: The random seed used when resampling.
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    median = np.median(values)
+    medians = bootstrap_medians(values, resamples,
+                                np.random.RandomState(seed))
+    bias = medians.mean() - median
+    error = medians.std(ddof=1) * ndtri((1 + confidence) / 2.)
+    return median - bias - error, median, median - bias + error
+
+
+def group_interval(args):
+    '''
+    Calls ``median_interval`` using a tuple of arguments, as required by
+    ``Pool.map``.
+    '''
+    return median_interval(*args)
+
+
+def intervals(groups, resamples=100, confidence=0.95, seed=None,
+              processes=1):
+    '''
+    Returns an ordered dictionary mapping each group to the result of
+    ``median_interval`` on its values.  Each group uses a different seed
+    so results do not depend on the number of processes.
+
+    Parameters:
+
+    - ``groups``: Dictionary mapping group to the list of its values.
+    - ``resamples``: How many bootstrap samples to use for each group.
+    - ``confidence``: The confidence level of the intervals.
+    - ``seed``: The random seed used for the first group.
+    - ``processes``: How many processes to spread the groups across.  If
+      None, one process is used per CPU.
+    '''
+    jobs = [(values, resamples, confidence,
+             None if seed is None else seed + number)
+            for number, values in enumerate(groups.values())]
+    if processes == 1:
+        results = map(group_interval, jobs)
+    else:
+        pool = Pool(processes)
+        results = pool.map(group_interval, jobs)
+        pool.close()
+    return OrderedDict(zip(groups.keys(), results))
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Find confidence intervals of evaluations to success.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filename', nargs='?', default='rdata.csv',
+                        help='The rdata.csv file or run index to read.')
+    parser.add_argument('-resamples', dest='resamples', type=int,
+                        default=100,
+                        help='How many bootstrap samples to use per group.')
+    parser.add_argument('-confidence', dest='confidence', type=float,
+                        default=0.95,
+                        help='The confidence level of the intervals.')
+    parser.add_argument('-seed', dest='seed', type=int,
+                        help='Use a specific seed when resampling.')
+    parser.add_argument('-processes', dest='processes', type=int, default=1,
+                        help='How many processes to use, 0 for all CPUs.')
+    args = parser.parse_args()
+
+    if args.filename.endswith('.db'):
+        groups = read_index(args.filename)
+    else:
+        groups = read_rdata(args.filename)
+    results = intervals(groups, args.resamples, args.confidence, args.seed,
+                        args.processes or None)
+    headers = group_columns + ['lower.ci', 'median', 'upper.ci']
+    rows = [list(group) + ['%.1f' % value for value in result]
+            for group, result in results.items()]
+    # Order by the problem and then the median number of evaluations
+    rows.sort(key=lambda row: (row[0], float(row[-2])))
+    widths = [max(len(str(row[column])) for row in rows + [headers])
+              for column in range(len(headers))]
+    for row in [headers] + rows:
+        print ' '.join(str(value).rjust(width)
+                       for value, width in zip(row, widths))
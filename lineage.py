@@ -0,0 +1,299 @@
+'''
+Records the lineage of each run, meaning the sequence of parents accepted
+by ``evolution.generate``, in a compact binary file.  Each accepted parent is
+stored as the genes which changed from the previous parent, along with its
+fitness and, when ``reorder`` is used, how the nodes were reordered in
+between.  Rejected offspring are not stored.
+
+Replaying a lineage rebuilds every parent of every run without repeating
+evolution, so new per-generation statistics can be found far faster than
+performing the runs again.  If the parents are evaluated during replay,
+their semantics and never active information match those seen during the
+original run.  Use ``main.py -lineage run.lineage.gz`` to record lineages,
+and this module as an executable to replay them:
+
+``python lineage.py run.lineage.gz -check``
+
+which evaluates every parent again, checks its fitness matches the recorded
+fitness, and recalculates the semantic change statistics of each run, such
+as ``active_nodes_changed``.
+
+The file begins with a single line json header containing the ``version``
+and the run's ``config``, followed by one binary record per parent.  Each
+record starts with ``record_format``, followed by ``order_length`` node
+positions and ``change_count`` pairs of gene index and value.  Function
+genes are stored as their index in the problem's list of operators.
+'''
+
+import json
+import struct
+from array import array
+from collections import defaultdict
+from evolution import Individual, override_methods, record_changes
+from util import open_file_method
+import problems
+
+# Increased whenever the layout of a lineage file changes
+version = 1
+
+# Kind ('P' for a new population, 'T' for a transition), run, population,
+# generation, fitness, order length, change count
+record_format = struct.Struct('<cHHIdII')
+
+
+class LineageWriter(object):
+    '''
+    Writes the parents accepted by ``evolution.generate`` to a lineage file.
+    '''
+
+    def __init__(self, filename, config):
+        '''
+        Open a new lineage file.  Will attempt to use file extension to detect
+        correct file type.
+
+        Parameters:
+
+        - ``filename``: The path to write to.
+        - ``config``: The configuration of the runs, including the
+          ``function_list``.
+        '''
+        self.file = open_file_method(filename)(filename, 'wb')
+        self.functions = {function: index for index, function in
+                          enumerate(config['function_list'])}
+        settings = {key: value for key, value in config.iteritems()
+                    if key != 'function_list'}
+        self.file.write(json.dumps({'version': version,
+                                    'config': settings}) + '\n')
+        self.run = 0
+        self.populations = 0
+        # For each population, where each node of the last recorded parent
+        # has been moved to by reordering
+        self.orders = {}
+
+    def start_run(self, run):
+        '''
+        Sets the run number stored with each following record.
+        '''
+        self.run = run
+
+    def write(self, kind, population, generation, fitness, order, changes):
+        '''
+        Writes a single record.
+
+        Parameters:
+
+        - ``kind``: Either ``P`` or ``T``.
+        - ``population``: The population the record belongs to.
+        - ``generation``: The generation the parent was accepted on.
+        - ``fitness``: The parent's fitness.
+        - ``order``: List of node positions, or an empty list.
+        - ``changes``: Flat list of gene index, gene value pairs.
+        '''
+        self.file.write(record_format.pack(kind, self.run, population,
+                                           generation, fitness, len(order),
+                                           len(changes) // 2))
+        self.file.write(array('i', order).tostring())
+        self.file.write(array('i', changes).tostring())
+
+    def encode(self, gene):
+        '''
+        Returns the integer used to store ``gene``.
+        '''
+        if isinstance(gene, int):
+            return gene
+        return self.functions[gene]
+
+    def add_population(self, parent):
+        '''
+        Records the evaluated initial parent of a new population, returning
+        the number used to identify the population.
+        '''
+        population = self.populations
+        self.populations += 1
+        changes = []
+        for index, gene in enumerate(parent.genes):
+            changes.extend((index, self.encode(gene)))
+        self.write('P', population, 0, parent.fitness, [], changes)
+        return population
+
+    def reorder(self, population, new_order):
+        '''
+        Records that the parent of ``population`` was reordered using
+        ``new_order``, as returned by ``Individual.reorder``.
+        '''
+        previous = self.orders.get(population)
+        if previous is None:
+            self.orders[population] = new_order
+        else:
+            self.orders[population] = {node: new_order[position]
+                                       for node, position in
+                                       previous.iteritems()}
+
+    def transition(self, population, generation, parent, child):
+        '''
+        Records that ``child`` replaced ``parent`` as the parent of
+        ``population``.
+        '''
+        order = self.orders.pop(population, None)
+        positions = []
+        if order is not None:
+            positions = [order[node] for node in range(parent.graph_length)]
+        changes = []
+        for index, (gene, old) in enumerate(zip(child.genes, parent.genes)):
+            if gene != old:
+                changes.extend((index, self.encode(gene)))
+        self.write('T', population, generation, child.fitness, positions,
+                   changes)
+
+    def close(self):
+        '''
+        Finish writing the file.
+        '''
+        self.file.close()
+
+
+def read(filename):
+    '''
+    Returns the configuration stored in a lineage file, and a generator of
+    its records.  Each record is a tuple of kind, run, population,
+    generation, fitness, list of node positions and list of (gene index,
+    value) pairs.  Raises ``ValueError`` if the file was written by an
+    incompatible version of this module.
+    '''
+    f = open_file_method(filename)(filename, 'rb')
+    header = json.loads(f.readline())
+    if header.get('version') != version:
+        raise ValueError('Unsupported lineage version %s' %
+                         header.get('version'))
+
+    def records():
+        with f:
+            while True:
+                data = f.read(record_format.size)
+                if len(data) < record_format.size:
+                    return
+                (kind, run, population, generation, fitness, order_length,
+                 change_count) = record_format.unpack(data)
+                order = array('i')
+                order.fromstring(f.read(order_length * order.itemsize))
+                changes = array('i')
+                changes.fromstring(f.read(change_count * 2 *
+                                          changes.itemsize))
+                yield (kind, run, population, generation, fitness,
+                       order.tolist(), zip(changes[::2], changes[1::2]))
+    return header['config'], records()
+
+
+def replay(filename, evaluate=False):
+    '''
+    Rebuilds the parents stored in a lineage file, yielding a tuple of the
+    run, population, generation, previous parent and new parent for every
+    record.  The previous parent is None for the first parent of each
+    population.
+
+    NOTE: Like ``evolution.generate``, this replaces methods of
+    ``Individual`` depending on the configuration.
+
+    Parameters:
+
+    - ``filename``: The lineage file to replay.
+    - ``evaluate``: If True, every parent is evaluated, setting its fitness,
+      semantics and never active information.  Otherwise the recorded
+      fitness is used.
+    '''
+    config, records = read(filename)
+    evaluator = problems.__dict__[config['problem']](config)
+    config['function_list'] = evaluator.operators
+    config['max_arity'] = evaluator.max_arity
+    override_methods(config)
+    node_step = config['max_arity'] + 1
+    function_genes = config['graph_length'] * node_step
+    inputs = {index: index for index in range(-config['input_length'], 0)}
+
+    def decode(index, value):
+        if index < function_genes and index % node_step == 0:
+            return evaluator.operators[value]
+        return value
+
+    def apply_changes(individual, changes):
+        for index, value in changes:
+            individual.genes[index] = decode(index, value)
+        # Changes are not logged, so active nodes must be found again
+        individual.changes = None
+
+    parents = {}
+    for (kind, run, population, generation, fitness, order,
+         changes) in records:
+        key = run, population
+        if kind == 'P':
+            previous = None
+            parent = Individual(**config)
+            apply_changes(parent, changes)
+            parent.determine_active_nodes()
+        else:
+            previous = parents[key]
+            if order:
+                new_order = dict(inputs)
+                new_order.update(enumerate(order))
+                previous.apply_order(new_order)
+                previous.determine_active_nodes()
+            parent = previous.new(apply_changes, changes)
+        if evaluate:
+            parent.fitness = evaluator.get_fitness(parent)
+        else:
+            parent.fitness = fitness
+        parents[key] = parent
+        yield run, population, generation, previous, parent
+
+
+def run_statistics(filename):
+    '''
+    Replays a lineage file, evaluating every parent, and returns a
+    dictionary mapping each run number to its statistics as found by
+    ``evolution.record_changes``.  Each run's statistics also include
+    ``mismatched``, the number of parents whose fitness was not the same as
+    when they were recorded.
+    '''
+    config, records = read(filename)
+    recorded = {(run, population, generation): fitness
+                for (_, run, population, generation, fitness, _, _)
+                in records}
+    statistics = {}
+    for run, population, generation, previous, parent in replay(filename,
+                                                               True):
+        if run not in statistics:
+            statistics[run] = {'inactive_bits_changed': defaultdict(int),
+                               'reactivated_nodes': defaultdict(int),
+                               'active_nodes_changed': defaultdict(int),
+                               'active_bits_changed': defaultdict(int),
+                               'child_replaced_parent': 0,
+                               'mismatched': 0}
+        output = statistics[run]
+        if previous is not None:
+            record_changes(output, previous, parent)
+        if parent.fitness != recorded[run, population, generation]:
+            output['mismatched'] += 1
+    return statistics
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Replay the lineage of recorded runs.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filename', type=str,
+                        help='The lineage file to replay.')
+    parser.add_argument('-check', dest='check', action='store_true',
+                        help='Evaluate every parent and recalculate the' +
+                        ' semantic change statistics of each run.')
+    args = parser.parse_args()
+
+    if args.check:
+        for run, output in sorted(run_statistics(args.filename).items()):
+            print 'Run', run
+            for key, value in sorted(output.items()):
+                if isinstance(value, dict):
+                    value = sorted(value.items())
+                print '\t', key, value
+    else:
+        for run, population, generation, _, parent in replay(args.filename):
+            print run, population, generation, parent.fitness,
+            print len(parent.active)
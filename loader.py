@@ -0,0 +1,156 @@
+'''
+Shared loader used by the analysis scripts to read result files.  Files are
+decompressed and parsed in a pool of processes, and only the requested fields
+are sent back.  Extracted fields are also saved to an on disk cache, so
+repeating an analysis does not need to parse the files again.  Cache entries
+are ignored if the result file's size or modification time changes.
+
+Fields are given as tuples describing where to find them in the list returned
+by ``util.load_list``.  For example ``(1, 'evals')`` is the number of
+evaluations used by the first run, and ``(1, 'bests', -1)`` is the full
+``dump`` of the final best of the first run.
+
+Other modules can register derived fields, which are computed from the whole
+file by a worker process and cached the same way.  A field whose first
+element is a name in ``derived`` is found by calling the registered function
+with the loaded file and the remaining elements of the field.
+'''
+
+import cPickle
+import hashlib
+import os
+from itertools import imap
+from multiprocessing import Pool
+from history import get_best
+from util import load_list
+
+# Default location of the cache of extracted fields
+cache_directory = '.cache'
+
+# Maps names of derived fields to the functions that compute them
+derived = {}
+
+
+def extract(data, field):
+    '''
+    Returns the value found by following the ``field`` tuple of keys and
+    indices through ``data``.  Recorded bests are expanded if necessary.
+    '''
+    if field[0] in derived:
+        return derived[field[0]](data, *field[1:])
+    value = data
+    for depth, key in enumerate(field):
+        if depth > 0 and field[depth - 1] == 'bests':
+            value = get_best(value, key)
+        else:
+            value = value[key]
+    return value
+
+
+def parse(arguments):
+    '''
+    Loads a single file and extracts the requested fields.  Returns a
+    dictionary mapping each field to its value, or None if the file could not
+    be parsed or does not contain a requested field, such as a streamed file
+    with no completed runs.  Intended to be run by a worker process.
+
+    Parameters:
+
+    - ``arguments``: Two part tuple of filename and list of fields to extract.
+    '''
+    filename, fields = arguments
+    try:
+        data = load_list(filename)
+        return {field: extract(data, field) for field in fields}
+    except (ValueError, IOError, EOFError, IndexError, KeyError):
+        return None
+
+
+def cache_path(filename, directory):
+    '''
+    Returns the path of the cache entry used to store fields of ``filename``.
+    '''
+    key = hashlib.sha1(os.path.abspath(filename)).hexdigest()
+    return os.path.join(directory, key + '.pkl')
+
+
+def read_cache(filename, directory):
+    '''
+    Returns the dictionary of cached fields for ``filename``, which is empty
+    if nothing is cached or the file has changed since it was cached.
+    '''
+    stat = os.path.getmtime(filename), os.path.getsize(filename)
+    try:
+        with open(cache_path(filename, directory), 'rb') as f:
+            cached = cPickle.load(f)
+        if cached['stat'] == stat:
+            return cached['fields']
+    except (IOError, EOFError, cPickle.UnpicklingError, KeyError):
+        pass
+    return {}
+
+
+def write_cache(filename, directory, fields):
+    '''
+    Stores the dictionary of extracted ``fields`` as the cache entry for
+    ``filename``.
+    '''
+    stat = os.path.getmtime(filename), os.path.getsize(filename)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    temporary = cache_path(filename, directory) + '.tmp'
+    with open(temporary, 'wb') as f:
+        cPickle.dump({'stat': stat, 'fields': fields}, f,
+                     cPickle.HIGHEST_PROTOCOL)
+    os.rename(temporary, cache_path(filename, directory))
+
+
+def load_fields(filenames, fields, processes=None, directory=cache_directory):
+    '''
+    Generator that yields ``(filename, values)`` for each of the ``filenames``
+    in order, where ``values`` maps each of the requested ``fields`` to its
+    value in that file.  Files that cannot be parsed are reported as FAILED
+    and skipped.
+
+    Parameters:
+
+    - ``filenames``: The list of result files to load.
+    - ``fields``: List of field tuples to extract from each file.
+    - ``processes``: How many worker processes to use for parsing.  Defaults
+      to the number of CPUs.  Using 1 parses files in the calling process.
+    - ``directory``: Where to store cached fields.  Use None to disable the
+      cache.
+    '''
+    fields = [tuple(field) for field in fields]
+    cached = {}
+    missing = []
+    for filename in filenames:
+        if directory is not None:
+            cached[filename] = read_cache(filename, directory)
+        else:
+            cached[filename] = {}
+        if any(field not in cached[filename] for field in fields):
+            missing.append(filename)
+    jobs = [(filename, fields) for filename in missing]
+    missing = set(missing)
+    if processes == 1 or len(jobs) <= 1:
+        parsed = imap(parse, jobs)
+        pool = None
+    else:
+        pool = Pool(processes)
+        parsed = pool.imap(parse, jobs, chunksize=4)
+    try:
+        for filename in filenames:
+            values = cached[filename]
+            if filename in missing:
+                extracted = next(parsed)
+                if extracted is None:
+                    print filename, "FAILED"
+                    continue
+                values.update(extracted)
+                if directory is not None:
+                    write_cache(filename, directory, values)
+            yield filename, {field: values[field] for field in fields}
+    finally:
+        if pool is not None:
+            pool.terminate()
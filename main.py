@@ -24,12 +24,18 @@ For any support questions email brianwgoldman@acm.org.
 '''
 
 from evolution import Individual, multi_indepenedent
+from history import BestHistory
+from aggregate import Aggregate
+from telemetry import Heartbeat
+from lineage import LineageWriter
+import memory
 import problems
 import util
 from collections import defaultdict
 
 
-def one_run(evaluator, config, frequencies):
+def one_run(evaluator, config, frequencies, writer=None, heartbeat=None,
+            lineage=None):
     '''
     Performs a single run of the given configuration.  Returns a dictionary
     containing results.
@@ -37,7 +43,10 @@ def one_run(evaluator, config, frequencies):
     Parameters:
 
     - ``evaluator``: An object with the function get_fitness that takes an
-      individual and returns its fitness value
+      individual and returns its fitness value.  If it also has the
+      functions ``start_run`` and ``results``, such as
+      ``problems.Bounded_Problem``, they are called at the start of the run
+      and to add to the returned dictionary respectively.
     - ``config``: A dictionary containing all of the configuration information
       required to perform a experimental run, including:
 
@@ -49,46 +58,118 @@ def one_run(evaluator, config, frequencies):
         termination.
       - ``max_fitness``: The fitness required to cause a "successful"
         termination.
+      - ``record_bests``: If True, every improvement to the best individual
+        is recorded in ``bests``, and the order test inputs were evaluated
+        in is returned in ``test_inputs``.  Requires full ``bookkeeping``,
+        as recorded bests contain never active information.
+      - ``keyframe_frequency``: Optional, how often a recorded best is stored
+        in full instead of as changes from the previous best.  See
+        ``history.BestHistory``.
+      - ``compact_bests``: Optional, if True recorded bests stored in full
+        use ``util.pack_genome``.
+      - ``bounded_memory``: Optional, if True individuals use fixed width
+        storage and recorded bests which are not streamed to ``writer`` are
+        compacted.  See ``memory.bound_individual``.
+      - ``memory_report``: Optional, if True the memory used by the run is
+        returned in ``memory_bytes``.  See ``memory.run_report``.
+      - ``timing``: Optional, if True the time spent in each phase of
+        evolution is returned in ``phase_seconds`` and ``phase_calls``.  See
+        ``util.PhaseTimer``.
     - ``frequencies``:  Dictionary used to return information about how often
       individuals of different lengths are evolved.  Set by evolution.generate.
+    - ``writer``: Optional ``util.ResultWriter``.  If given, recorded bests
+      are streamed to the writer instead of being stored in the returned
+      ``bests`` list.
+    - ``heartbeat``: Optional ``telemetry.Heartbeat``.  If given, the run's
+      progress is reported every ``heartbeat.stride`` evaluations.
+    - ``lineage``: Optional ``lineage.LineageWriter``.  If given, every
+      parent accepted during the run is recorded.
     '''
+    bookkeeping = config.get('bookkeeping', 'full')
+    if config['record_bests'] and bookkeeping != 'full':
+        raise ValueError('Recording bests requires full bookkeeping')
     best = None
     last_improved = -1
     output = {'bests': []}
-    generator = enumerate(multi_indepenedent(config, output, frequencies))
+    history = BestHistory(config.get('keyframe_frequency', 50))
+    timer = util.PhaseTimer() if config.get('timing', False) else None
+    bounded = config.get('bounded_memory', False)
+    compact_bests = (config.get('compact_bests', False) or
+                     (bounded and writer is None))
+    tests = None
+    if hasattr(evaluator, 'training'):
+        tests = len(evaluator.training)
+    if hasattr(evaluator, 'start_run'):
+        evaluator.start_run()
+    generator = enumerate(multi_indepenedent(config, output, frequencies,
+                                             timer, lineage))
     for evals, individual in generator:
+        if bounded and evals < config['pop_size']:
+            # The first individual of each population is yielded before
+            # any offspring are copied from it
+            memory.bound_individual(individual, tests)
+        if timer is not None:
+            timer.start()
         individual.fitness = evaluator.get_fitness(individual)
+        if timer is not None:
+            timer.lap('evaluation')
         if best < individual:
             best = individual
             last_improved = evals
             if config['record_bests']:
                 save = best.dump()
                 save['evals'] = evals
-                output['bests'].append(save)
+                save = history.encode(save)
+                if compact_bests and 'delta' not in save:
+                    save = util.pack_genome(save)
+                if writer is None:
+                    output['bests'].append(save)
+                else:
+                    writer.write_best(save)
                 output['test_inputs'] = sorted(best.input_order.keys(),
                                                key=best.input_order.__getitem__)
             if config['verbose']:
                 print '\t', last_improved, best.fitness, len(best.active)
+            if timer is not None:
+                timer.lap('record')
+        if heartbeat is not None and evals % heartbeat.stride == 0:
+            heartbeat.beat(evals, best, last_improved, output,
+                           config['max_evals'])
         if (evals >= config['max_evals'] or
             best.fitness >= config['max_fitness']):
             break
+    if heartbeat is not None:
+        heartbeat.beat(evals, best, last_improved, output,
+                       config['max_evals'], 'finished')
     if config['verbose']:
         print "Best Found"
         print 'Before simplify', best.fitness, len(best.active)
         best.show_active()
-        simplified = best.new(Individual.simplify)
-        simplified.fitness = evaluator.get_fitness(simplified)
-        print "After simplify", simplified.fitness, len(simplified.active)
-        simplified.show_active()
+        # Simplifying relies on the semantics recorded during evaluation
+        if bookkeeping == 'full':
+            simplified = best.new(Individual.simplify)
+            simplified.fitness = evaluator.get_fitness(simplified)
+            print "After simplify", simplified.fitness, len(simplified.active)
+            simplified.show_active()
     output.update({'fitness': best.fitness, 'evals': evals,
                    'success': best.fitness >= config['max_fitness'],
                    'phenotype': len(best.active),
-                   'normal': output['skipped'] + evals,
-                   'unused': sum(best.never_active)})
+                   'normal': (output['skipped'] +
+                              output.get('semantic_skipped', 0) +
+                              output.get('canonical_skipped', 0) + evals)})
+    if bookkeeping == 'full':
+        # Never active information is incomplete without full bookkeeping
+        output['unused'] = sum(best.never_active)
+    if timer is not None:
+        output.update(timer.results())
+    if hasattr(evaluator, 'results'):
+        output.update(evaluator.results())
+    if config.get('memory_report', False):
+        output['memory_bytes'] = memory.run_report(output, best)
     return output
 
 
-def all_runs(config):
+def all_runs(config, writer=None):
     '''
     Perform all of the requested runs on a given problem.  Returns a two part
     tuple:
@@ -109,6 +190,14 @@ def all_runs(config):
       - ``problem``: The name of which problem from the ``problem`` module to
         run experiments on.
       - ``runs``: How many runs to perform
+    - ``writer``: Optional ``util.ResultWriter`` used to stream each run's
+      results to disk as soon as they are available.
+
+    If ``config`` contains ``heartbeat_file`` or ``heartbeat_echo``, progress
+    is reported every ``heartbeat_stride`` evaluations.  See
+    ``telemetry.Heartbeat``.  If ``config`` contains ``lineage_file``, the
+    parents accepted during every run are recorded to it.  See
+    ``lineage.LineageWriter``.
     '''
     # Construct the problem object
     evaluator = problems.__dict__[config['problem']](config)
@@ -117,48 +206,57 @@ def all_runs(config):
     config['max_arity'] = evaluator.max_arity
     results = []
     frequencies = defaultdict(int)
+    heartbeat = None
+    if config.get('heartbeat_file') or config.get('heartbeat_echo'):
+        settings = {key: config.get(key) for key in
+                    ['problem', 'graph_length', 'ordering', 'duplicate',
+                     'seed']}
+        heartbeat = Heartbeat(config.get('heartbeat_file'),
+                              config.get('heartbeat_stride', 10000),
+                              config.get('heartbeat_echo', False), settings)
+    lineage = None
+    if config.get('lineage_file'):
+        lineage = LineageWriter(config['lineage_file'], config)
     try:
         for run in range(config['runs']):
             print "Starting Run", run + 1
-            result = one_run(evaluator, config, frequencies)
+            if heartbeat is not None:
+                heartbeat.start_run(run + 1)
+            if lineage is not None:
+                lineage.start_run(run + 1)
+            result = one_run(evaluator, config, frequencies, writer,
+                             heartbeat, lineage)
             print [(key, result[key]) for key in ['evals', 'fitness']]
+            if 'phase_seconds' in result:
+                print sorted(result['phase_seconds'].items(),
+                             key=lambda phase: -phase[1])
+            if writer is not None:
+                writer.write_run(result)
             results.append(result)
     except KeyboardInterrupt:
         print "Interrupted"
+    if lineage is not None:
+        lineage.close()
     return results, frequencies
 
 
-def combine_results(results):
+def combine_results(results, sketch_size=None):
     '''
     Given a list of result dictionaries, return analysis information such as
     the median values of each statistic as well as the median absolute
-    deviation.
+    deviation.  Counters, such as ``active_bits_changed``, are summed across
+    all runs.  See ``aggregate.Aggregate``.
 
     Parameters:
 
     - ``results``: A list of dictionaries containing similar key values.
+    - ``sketch_size``: Optional, limits how many values of each statistic are
+      kept, making the medians approximate.
     '''
-    combined = {}
-    # Collect the successful runs
-    successful = [result for result in results if result['success']]
-    # Combine like keys across all runs
+    combined = Aggregate(sketch_size)
     for result in results:
-        for key, value in result.iteritems():
-            try:
-                combined[key].append(value)
-            except KeyError:
-                combined[key] = [value]
-    # Analyze the values for each key
-    for key, value in combined.items():
-        try:
-            combined[key] = util.median_deviation(value)
-        except TypeError:
-            del combined[key]
-    try:
-        combined['success'] = len(successful) / float(len(results)), 0
-    except ZeroDivisionError:
-        combined['success'] = 0, 0
-    return combined
+        combined.add(result)
+    return combined.results()
 
 
 def frequencies_to_vector(config, frequencies):
@@ -195,7 +293,8 @@ if __name__ == '__main__':
     parser.add_argument('-duplicate', dest='duplicate', type=str,
                         help='Specifies if evolution should should avoid' +
                         ' duplicated evaluations.  Valid settings are: ' +
-                        'normal, skip, accumulate, single')
+                        'normal, skip, accumulate, single, semantic,' +
+                        ' canonical')
     parser.add_argument('-ordering', dest='ordering', type=str,
                         help='Specifies how to handle node ordering.' +
                         '  Valid settings are: ' +
@@ -204,6 +303,17 @@ if __name__ == '__main__':
                         action='store_true',
                         help='Include this flag to record the full genome' +
                         ' of the first individual to reach each new fitness.')
+    parser.add_argument('-keyframe', dest='keyframe_frequency', type=int,
+                        help='How many recorded bests to store as changes' +
+                        ' from the previous best before storing one in full.')
+    parser.add_argument('-compact', dest='compact_bests',
+                        action='store_true',
+                        help='Include this flag to store recorded genomes' +
+                        ' using a compact binary encoding.')
+    parser.add_argument('-sketch', dest='sketch_size', type=int,
+                        help='Limit how many values of each statistic are' +
+                        ' kept when combining runs, making medians' +
+                        ' approximate.')
     parser.add_argument('-c', dest='output_config', type=str,
                         help='Outputs a single configuration file containing' +
                         ' the entire configuration used in this run')
@@ -212,17 +322,67 @@ if __name__ == '__main__':
 
     parser.add_argument('-out', dest='output_results', type=str,
                         help='Specify a file to output the results.')
+    parser.add_argument('-stream', dest='stream_results', type=str,
+                        help='Specify a file to stream results to as each' +
+                        ' run finishes.  Recorded bests are written as they' +
+                        ' are found instead of being kept in memory.')
     parser.add_argument('-freq', dest='frequency_results', type=str,
                         help='Specify a file to output the frequency results.')
 
     parser.add_argument('-profile', dest='profile', action='store_true',
                         help='Include this flag to run a profiler')
+    parser.add_argument('-heartbeat', dest='heartbeat_file', type=str,
+                        help='Periodically write the progress of the current' +
+                        ' run to this json file.')
+    parser.add_argument('-stride', dest='heartbeat_stride', type=int,
+                        help='How many evaluations between heartbeats.')
+    parser.add_argument('-heartbeat_echo', dest='heartbeat_echo',
+                        action='store_true',
+                        help='Include this flag to also print each heartbeat.')
+    parser.add_argument('-lineage', dest='lineage_file', type=str,
+                        help='Specify a file to record every accepted parent' +
+                        ' to, for replay using lineage.py.')
+    parser.add_argument('-bookkeeping', dest='bookkeeping', type=str,
+                        choices=['full', 'none', 'sampled'],
+                        help='How much analysis information to record during' +
+                        ' evolution.  Use none for the fastest runs.' +
+                        '  Only full can be used with -record_bests.')
+    parser.add_argument('-sample', dest='bookkeeping_stride', type=int,
+                        help='With sampled bookkeeping, how many generations' +
+                        ' between samples.')
+    parser.add_argument('-bounded', dest='bounded_memory',
+                        action='store_true',
+                        help='Include this flag to limit the memory used by' +
+                        ' each run.')
+    parser.add_argument('-memory', dest='memory_report', action='store_true',
+                        help='Include this flag to record the memory used' +
+                        ' by each run.')
+    parser.add_argument('-timing', dest='timing', action='store_true',
+                        help='Include this flag to record the time spent in' +
+                        ' each phase of evolution.')
+    parser.add_argument('-packed', dest='packed', action='store_true',
+                        help='Include this flag to evaluate binary problems' +
+                        ' on all tests at once.')
+    parser.add_argument('-memo', dest='memo_size', type=int,
+                        help='Use packed evaluation, remembering up to twice' +
+                        ' this many node semantics.')
+    parser.add_argument('-chunk', dest='chunk_size', type=int,
+                        help='Use packed evaluation on this many tests at a' +
+                        ' time, for binary problems with many inputs.')
+    parser.add_argument('-racing', dest='racing', type=str,
+                        choices=['exact', 'approximate'],
+                        help='Stop evaluating offspring once they are shown' +
+                        ' to be worse than their parent.')
+    parser.add_argument('-confidence', dest='racing_confidence', type=float,
+                        help='With approximate racing, the required' +
+                        ' confidence an offspring is worse before stopping.')
 
     # Perform argument parsing
     args = parser.parse_args()
     config = util.load_configurations(args.configs)
     config['verbose'] = args.verbose
     config['record_bests'] = args.record_bests
+    config['compact_bests'] = args.compact_bests
 
     if args.seed != None:
         config['seed'] = args.seed
@@ -255,6 +415,54 @@ if __name__ == '__main__':
     if args.frequency_results != None:
         config['frequency_results'] = args.frequency_results
 
+    if args.keyframe_frequency != None:
+        config['keyframe_frequency'] = args.keyframe_frequency
+
+    if args.sketch_size != None:
+        config['sketch_size'] = args.sketch_size
+
+    if args.timing:
+        config['timing'] = True
+
+    if args.lineage_file != None:
+        config['lineage_file'] = args.lineage_file
+
+    if args.bookkeeping != None:
+        config['bookkeeping'] = args.bookkeeping
+
+    if args.bookkeeping_stride != None:
+        config['bookkeeping_stride'] = args.bookkeeping_stride
+
+    if args.bounded_memory:
+        config['bounded_memory'] = True
+
+    if args.memory_report:
+        config['memory_report'] = True
+
+    if args.packed:
+        config['packed'] = True
+
+    if args.memo_size != None:
+        config['memo_size'] = args.memo_size
+
+    if args.chunk_size != None:
+        config['chunk_size'] = args.chunk_size
+
+    if args.racing != None:
+        config['racing'] = args.racing
+
+    if args.racing_confidence != None:
+        config['racing_confidence'] = args.racing_confidence
+
+    if args.heartbeat_file != None:
+        config['heartbeat_file'] = args.heartbeat_file
+
+    if args.heartbeat_stride != None:
+        config['heartbeat_stride'] = args.heartbeat_stride
+
+    if args.heartbeat_echo:
+        config['heartbeat_echo'] = True
+
     if args.profile:
         # When profiling, just run the configuration
         import cProfile
@@ -262,10 +470,18 @@ if __name__ == '__main__':
         sys.exit()
 
     try:
+        writer = None
+        if args.stream_results != None:
+            writer = util.ResultWriter(args.stream_results)
         # Perform the actual run of the experiment
-        raw_results, frequencies = all_runs(config)
-        combined = sorted(combine_results(raw_results).items())
+        raw_results, frequencies = all_runs(config, writer)
+        combined = combine_results(raw_results, config.get('sketch_size'))
+        combined = sorted(combined.items())
         print combined
+        if writer != None:
+            # Finish the streamed file with the combined information
+            writer.write_combined(combined)
+            writer.close()
         if args.output_results != None:
             # Output the results, with the combined stuff on the first line
             util.save_list(args.output_results, [combined] + raw_results)
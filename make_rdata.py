@@ -4,28 +4,67 @@ R parsable output for use in analysis.  Run as a stand alone
 executable in the form of:
 
 ``python make_rdata.py final/*.dat.gz > rdata.csv``
+
+If the files have already been added to an index using ``run_index.py``,
+the index can be used instead, which avoids parsing any of the files:
+
+``python make_rdata.py final.db > rdata.csv``
 '''
 from __future__ import print_function
 import sys
 from os import path
-import json
-from util import open_file_method
+from pipeline import Stage, run
 
 column_headers = ['problem', 'duplication', 'ordering', 'genome_size',
                   'mutation_rate', 'seed', 'evaluations']
-print(','.join(column_headers))
-
-# Loop through all command line arguments
-for filename in sys.argv[1:]:
-    base = path.basename(filename)
-    try:
-        problem, dup, ordering, nodes, mut, seed = base.split('_')
-        with open_file_method(filename)(filename, 'r') as f:
-            data = json.load(f)
-        seed = seed.split('.')[0]
-        line = ','.join([problem, dup, ordering, nodes,
-                         mut, seed, str(data[1]['evals'])])
-        print(line)
-
-    except ValueError:
-        print("FAILED", filename)
+
+
+class RData(Stage):
+    '''
+    Analysis stage which writes one line of R parsable output per file.
+    '''
+    fields = [(1, 'evals')]
+
+    def __init__(self, out=sys.stdout):
+        '''
+        Starts the output by writing the column headers.
+
+        Parameters:
+
+        - ``out``: The file to write the output to.
+        '''
+        self.out = out
+        print(','.join(column_headers), file=self.out)
+
+    def add(self, filename, data):
+        '''
+        Writes the line for a single file.
+        '''
+        base = path.basename(filename)
+        try:
+            problem, dup, ordering, nodes, mut, seed = base.split('_')
+            seed = seed.split('.')[0]
+            line = ','.join([problem, dup, ordering, nodes,
+                             mut, seed, str(data[1, 'evals'])])
+            print(line, file=self.out)
+
+        except ValueError:
+            print("FAILED", filename, file=self.out)
+
+    def finish(self):
+        '''
+        Ensures all output has been written.
+        '''
+        self.out.flush()
+
+if __name__ == '__main__':
+    if sys.argv[1].endswith('.db'):
+        from run_index import connect, config_columns, select
+        print(','.join(column_headers))
+        # Only the first run of each file, as when parsing the files
+        for row in select(connect(sys.argv[1]), config_columns + ['evals'],
+                          run=0):
+            print(','.join(map(str, row)))
+    else:
+        # Loop through all command line arguments
+        run([RData()], sys.argv[1:])
@@ -0,0 +1,128 @@
+'''
+Helpers for evaluating binary problems on every test input at once.  A
+node's output on every test input, stored as the bits of a single integer as
+in ``semantics``, depends only on its function and the semantics of its two
+inputs, so it can be found using a single bitwise operation.  Use
+``main.py -packed`` to evaluate binary problems this way.
+
+The same combinations of function and input semantics recur constantly
+between offspring and across generations.  ``SemanticMemo`` stores the
+result of each combination it calculates, turning node evaluation into a
+dictionary lookup regardless of where the node is in the genome, and counts
+how often combinations are reused.  In CPython a lookup costs about as much
+as the bitwise operation it replaces, so the memo is only worthwhile for
+measuring reuse or for functions whose bitwise versions are expensive.  Use
+``main.py -memo`` to enable it.
+
+Memo entries are evicted in generations: new entries are added to the
+current table, and when it holds ``capacity`` entries it becomes the
+previous table, replacing the one before it.  Entries found in the previous
+table are moved back into the current table, so recently used entries
+survive while the number of entries stays below twice ``capacity``.
+'''
+
+from semantics import bit_functions
+
+
+def bitwise_versions(functions):
+    '''
+    Returns a dictionary mapping each function to its bitwise version from
+    ``semantics.bit_functions``.  Raises ``ValueError`` if a function has no
+    bitwise version.
+    '''
+    try:
+        return {function: bit_functions[function.__name__]
+                for function in functions}
+    except (KeyError, AttributeError):
+        raise ValueError('Every function must have a bitwise version in'
+                         ' semantics.bit_functions')
+
+
+def direct_lookup(functions, tests):
+    '''
+    Returns a function with the same behavior as ``SemanticMemo.lookup``
+    which always calculates the semantic.
+
+    Parameters:
+
+    - ``functions``: The list of functions nodes can use.
+    - ``tests``: The number of test inputs.
+    '''
+    bitwise = bitwise_versions(functions)
+    mask = (1 << tests) - 1
+
+    def lookup(function, first, second):
+        return bitwise[function](first, second, mask)
+    return lookup
+
+
+class SemanticMemo(object):
+    '''
+    Stores the semantic calculated by each combination of function and input
+    semantics.  Call ``lookup`` to find the semantic of a node, and
+    ``results`` to find how often the table was used.
+    '''
+
+    def __init__(self, functions, tests, capacity=100000):
+        '''
+        Parameters:
+
+        - ``functions``: The list of functions nodes can use.  Each must have
+          a bitwise version in ``semantics.bit_functions``.
+        - ``tests``: The number of test inputs, used to mask the results of
+          functions which invert their inputs.
+        - ``capacity``: How many entries are added to the current table
+          before it becomes the previous table.
+
+        Raises ``ValueError`` if a function has no bitwise version.
+        '''
+        self.functions = bitwise_versions(functions)
+        self.mask = (1 << tests) - 1
+        self.capacity = capacity
+        self.start_run()
+
+    def start_run(self):
+        '''
+        Empties the table and resets the counters at the start of a run.
+        '''
+        self.current = {}
+        self.previous = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, function, first, second):
+        '''
+        Returns the semantic of a node using ``function`` whose inputs have
+        the semantics ``first`` and ``second``.
+        '''
+        key = function, first, second
+        try:
+            semantic = self.current[key]
+            self.hits += 1
+            return semantic
+        except KeyError:
+            pass
+        try:
+            semantic = self.previous.pop(key)
+            self.hits += 1
+        except KeyError:
+            semantic = self.functions[function](first, second, self.mask)
+            self.misses += 1
+        if len(self.current) >= self.capacity:
+            self.evictions += len(self.previous)
+            self.previous = self.current
+            self.current = {}
+        self.current[key] = semantic
+        return semantic
+
+    def results(self):
+        '''
+        Returns a dictionary containing the number of ``memo_hits``,
+        ``memo_misses`` and ``memo_evictions`` and the ``memo_hit_rate``.
+        '''
+        lookups = self.hits + self.misses
+        return {'memo_hits': self.hits,
+                'memo_misses': self.misses,
+                'memo_evictions': self.evictions,
+                'memo_hit_rate': self.hits / float(lookups) if lookups else 0}
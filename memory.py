@@ -0,0 +1,93 @@
+'''
+Measures how much memory the parts of an individual and of a run use, and
+provides the storage used by the bounded memory run mode.
+
+In a normal run each individual stores its ``semantics`` as a list of Python
+integers, which gain a bit for every distinct input evaluated, and its
+``never_active`` information as a list of booleans.  Both lists are copied
+for every offspring.  The ``scratch`` space and ``input_order`` dictionary
+are shared by every individual in a population, as individuals are shallow
+copied.  Recorded bests are kept for the whole run unless streamed to disk
+using ``main.py -stream``.
+
+In bounded memory mode (``main.py -bounded``) ``semantics`` are stored in a
+fixed width ``array`` once the number of test inputs is known, if each
+semantic fits in a single machine word, ``never_active`` is stored in a
+``bytearray``, and recorded bests which are not streamed to disk are stored
+using ``util.pack_genome``.  Use ``main.py -memory`` to include a memory
+report in each run's results.
+'''
+
+import sys
+from array import array
+from types import FunctionType
+
+# Parts of an individual which are shared by the whole population
+shared = ['scratch', 'input_order']
+
+
+def deep_size(value, seen=None):
+    '''
+    Returns the number of bytes used by ``value`` and everything it
+    contains, counting each object only once.  Functions, booleans and None
+    are shared by the whole process, so are not counted.
+
+    Parameters:
+
+    - ``value``: The object to measure.
+    - ``seen``: Optional set of object ids which have already been counted.
+    '''
+    if seen is None:
+        seen = set()
+    if (id(value) in seen or value is None or isinstance(value, bool) or
+        isinstance(value, FunctionType)):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(key, seen) + deep_size(item, seen)
+                    for key, item in value.iteritems())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(deep_size(item, seen) for item in value)
+    return size
+
+
+def individual_report(individual):
+    '''
+    Returns a dictionary mapping each part of an individual to the number of
+    bytes it uses.  The parts listed in ``shared`` are used by every
+    individual in the population.
+    '''
+    return {part: deep_size(getattr(individual, part))
+            for part in ['genes', 'semantics', 'never_active', 'active',
+                         'scratch', 'input_order']}
+
+
+def run_report(output, best):
+    '''
+    Returns a dictionary mapping each part of a run's memory use to its size
+    in bytes: the recorded ``bests`` and each part of the ``best``
+    individual, prefixed by ``best_``.
+    '''
+    report = {'best_' + part: size
+              for part, size in individual_report(best).iteritems()}
+    report['bests'] = deep_size(output['bests'])
+    return report
+
+
+def bound_individual(individual, tests=None):
+    '''
+    Converts the storage of a newly created individual to the fixed width
+    storage used by the bounded memory mode.  Offspring copied from the
+    individual keep the same storage.
+
+    Parameters:
+
+    - ``individual``: The individual to convert, before it is evaluated.
+    - ``tests``: The number of distinct test inputs the individual will be
+      evaluated on.  If None, or too many for each semantic to fit in a
+      machine word, ``semantics`` are left as Python integers.
+    '''
+    if tests is not None and tests <= array('L').itemsize * 8:
+        individual.semantics = array('L', individual.semantics)
+    individual.never_active = bytearray(individual.never_active)
@@ -5,21 +5,23 @@ executable to process all result information for a single problem, such as:
 
 ``python never_actives.py final/multiply_accumulate_normal_*.dat.gz``
 
-Do not mix problems in a single run.
+Do not mix problems in a single run.  The information can also be plotted
+from an archive created by ``archive.py``, which is much faster for large
+genomes or many runs:
+
+``python never_actives.py parity_normal_normal``
 
 NOTE: You CANNOT use pypy for this as pylab is current unsupported.  Use
 python 2.7 instead.
 '''
 
-import json
 import sys
 from os import path
-from collections import defaultdict
-from util import median_deviation, open_file_method, set_fonts
-from pylab import show, get_cmap, concatenate, linspace, savefig
-import pylab as plt
-import matplotlib
-import numpy as np
+from shutil import rmtree
+from tempfile import mkdtemp
+from util import median_deviation, set_fonts
+from pipeline import Stage, run
+from archive import Archive, ArchiveWriter, group_means
 
 
 def cmap_discretize(cmap, N):
@@ -28,6 +30,8 @@ def cmap_discretize(cmap, N):
     cmap: colormap instance, eg. cm.jet. 
     N: number of colors.
     """
+    import matplotlib
+    from pylab import get_cmap, concatenate, linspace
 
     if type(cmap) == str:
         cmap = get_cmap(cmap)
@@ -42,90 +46,117 @@ def cmap_discretize(cmap, N):
     return matplotlib.colors.LinearSegmentedColormap(cmap.name + "_%d" % N,
                                                      cdict, 1024)
 
-if __name__ == '__main__':
-    set_fonts()
-    filecount = 0
-
-    storage = []
-    levels = set()
-    outname = None
-    percentages = []
-    best_worst = 0
-    # Run through all of the files gathering different seeds into lists
-    for filename in sys.argv[1:]:
-        base = path.basename(filename)
-        try:
-            print 'Processing file', filename
-            outname = base.split('_')[:3]
-            with open_file_method(filename)(filename, 'r') as f:
-                data = json.load(f)
-            graph_length = float(data[1]['bests'][-1]['graph_length'])
-            percentages.append(data[1]['unused'] / graph_length)
-            stripped = {}
-            best_worst = max(best_worst, data[1]['bests'][0]['fitness'])
-            for best in data[1]['bests']:
-                stripped[best['fitness']] = map(int, best['never_active'])
-                levels.add(best['fitness'])
-            storage.append(stripped)
-            filecount += 1
-        except ValueError:
-            print filename, "FAILED"
-    print "Loaded", filecount
+
+
+def plot_archive(archive, outname, display=True):
+    '''
+    Save the heatmap of never active nodes at each fitness level reached
+    by all runs in the ``archive``.
+
+    Parameters:
+
+    - ``archive``: The ``Archive`` containing the runs to plot.
+    - ``outname``: The list of file name parts used to name the plot.
+    - ``display``: If the plot should be shown after it is saved.
+    '''
+    from pylab import savefig
+    import pylab as plt
+    import numpy as np
+    runs = archive.runs
+    print "Loaded", len(runs)
+    percentages = [run['unused'] / float(run['graph_length']) for run in runs]
     print "Median final never active", median_deviation(percentages)
+    set_fonts()
 
     # Limits the number of unique fitness levels to plot
     ysteps = 40
-    scan_lines = [x for x in sorted(levels) if x >= best_worst]
+    levels = np.unique(archive.fitness)
+    best_worst = max(archive.fitness[run['offset']] for run in runs)
+    scan_lines = levels[levels >= best_worst]
     if len(scan_lines) > ysteps:
         step = float(len(scan_lines)) / ysteps
         print 'Step', step, 'highest', int(step * (ysteps - 1)), len(scan_lines)
-        scan_lines = [scan_lines[int(x * step)] for x in range(ysteps)]
+        scan_lines = scan_lines[(np.arange(ysteps) * step).astype(int)]
         # Ensure that the maximum fitness is always added to the scan lines
-        if scan_lines[-1] != max(levels):
-            scan_lines.append(max(levels))
-    combined = defaultdict(list)
-    for stored in storage:
-        index = 0
-        fitnesses, values = zip(*sorted(stored.items()))
-        # Finds the update closest to the scan line without going over
-        for scan_line in scan_lines:
-            while index < len(fitnesses) and fitnesses[index] <= scan_line:
-                index += 1
-            index -= 1
-            if index >= 0 and fitnesses[index] <= scan_line:
-                combined[scan_line].append(values[index])
-            else:
-                index = 0
-
-    for level, data in sorted(combined.items()):
-        print len(data), 'runs reached fitness', level
-    # Create the heatmap matrix
-    Z = []
-    complete_levels = []
+        if scan_lines[-1] != levels[-1]:
+            scan_lines = np.append(scan_lines, levels[-1])
+    # Finds the update closest to each scan line without going over
+    aligned = archive.align(scan_lines)
+    reached = (aligned >= 0).sum(axis=0)
+    for level, count in zip(scan_lines, reached):
+        if count:
+            print count, 'runs reached fitness', float(level)
+
+    # Create the heatmap matrix, only plotting complete levels
     groups = 50
-    genome_size = None
-    for level, partial in sorted(combined.items()):
-        # Only plots complete levels
-        if len(partial) == filecount:
-            # Convert the number to a percentage
-            each = [sum(joint) / float(len(joint)) * 100
-                    for joint in zip(*partial)]
-            genome_size = len(each)
-            size = len(each) / groups
-            grouped = [each[i * size:(i + 1) * size]
-                       for i in range(groups + 1)]
-            merged = [sum(group) / float(len(group)) for group in grouped
-                      if len(group) > 0]
-            Z.append(merged)
-            complete_levels.append(level)
+    complete = reached == len(runs)
+    complete_levels = scan_lines[complete]
+    Z = np.array([group_means(archive.never_active_percent(rows), groups)
+                  for rows in aligned[:, complete].transpose()])
     print 'Fitness levels reached by all runs:', len(complete_levels)
-    Z = np.array(Z).transpose()
-    X, Y = np.meshgrid(range(0, genome_size + 1, genome_size / groups), complete_levels)
-    im = plt.pcolormesh(X, Y, Z.transpose(), cmap=cmap_discretize("binary", 5), vmin=0, vmax=100)
+    genome_size = archive.genome_size
+    X, Y = np.meshgrid(range(0, genome_size + 1, genome_size / groups),
+                       complete_levels)
+    im = plt.pcolormesh(X, Y, Z, cmap=cmap_discretize("binary", 5),
+                        vmin=0, vmax=100)
     cbar = plt.colorbar(im, orientation='horizontal')
     cbar.set_label("Percentage Of Runs Where Node Was Never Active")
     plt.ylim(min(complete_levels), max(complete_levels))
     plt.xlabel('Node Index')
     plt.ylabel('Fitness Level')
     savefig('_'.join(outname) + '.eps', dpi=300)
-    plt.show()
+    if display:
+        plt.show()
+    plt.close()
+
+
+class NeverActives(Stage):
+    '''
+    Analysis stage which archives which nodes were never active at each
+    fitness level and plots them as a heatmap.
+    '''
+    fields = [(1, 'unused'), (1, 'bests')]
+    group = 3
+
+    def __init__(self, display=True):
+        '''
+        Parameters:
+
+        - ``display``: If the plot should be shown after it is saved.
+        '''
+        self.display = display
+        self.outname = None
+        # Runs are stored in a temporary archive instead of in memory
+        self.directory = mkdtemp(prefix='never_actives')
+        self.writer = ArchiveWriter(self.directory)
+
+    def add(self, filename, data):
+        '''
+        Archive the never active nodes of every best in a single file.
+        '''
+        base = path.basename(filename)
+        try:
+            print 'Processing file', filename
+            self.outname = base.split('_')[:3]
+            self.writer.add_run(data[1, 'bests'], data[1, 'unused'], filename)
+        except ValueError:
+            print filename, "FAILED"
+
+    def finish(self):
+        '''
+        Save the heatmap of all files added.
+        '''
+        self.writer.close()
+        try:
+            plot_archive(Archive(self.directory), self.outname, self.display)
+        finally:
+            rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    if path.isdir(sys.argv[1]):
+        # Plot from an archive created by archive.py
+        name = path.basename(path.normpath(sys.argv[1]))
+        plot_archive(Archive(sys.argv[1]), name.split('_')[:3])
+    else:
+        run([NeverActives()], sys.argv[1:])
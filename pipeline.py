@@ -0,0 +1,142 @@
+'''
+Runs several analyses over the final/ folder while reading each result file
+only once.  Each analysis script defines a ``Stage`` which requests the
+fields it needs from ``loader`` and accumulates its own state as files are
+added.  Plotting and statistics libraries are only imported by the stages
+that need them, when they finish.  Use this module as an executable to
+produce the contents of Tables II, III, IV and VI as well as rdata.csv:
+
+``python pipeline.py final/*.dat.gz``
+
+Stages that should not mix different problems or variants are run separately
+for each group of files, so all problems can be processed at once.  Use
+``-stages`` to select which analyses to perform.
+
+NOTE: You CANNOT use pypy for the ``stats``, ``bar`` or ``never`` stages as
+scipy and pylab are currently unsupported.  Use python 2.7 instead.
+'''
+
+from os import path
+from collections import OrderedDict
+from loader import load_fields
+
+# Maps stage names to the module and class implementing them
+stage_classes = OrderedDict([('rdata', ('make_rdata', 'RData')),
+                             ('stats', ('stats', 'Stats')),
+                             ('bar', ('bar_plot', 'BarPlot')),
+                             ('bits', ('bit_behavior', 'BitBehavior')),
+                             ('never', ('never_actives', 'NeverActives'))])
+
+
+class Stage(object):
+    '''
+    The abstract base of an analysis stage.
+    '''
+    # List of fields each file must provide, as used by ``loader``
+    fields = []
+    # How many parts of the file name must match for files to be analyzed
+    # together, for example 1 keeps different problems separate
+    group = 0
+
+    def add(self, filename, data):
+        '''
+        Designed to force children of this class to implement this function.
+        Children use this function to include the ``data`` loaded from
+        ``filename``, which maps each requested field to its value.
+        '''
+        raise NotImplementedError()
+
+    def finish(self):
+        '''
+        Designed to force children of this class to implement this function.
+        Children use this function to output their results after all files
+        have been added.
+        '''
+        raise NotImplementedError()
+
+
+def run(stages, filenames, processes=None):
+    '''
+    Adds every file to each of the ``stages`` and then finishes them.
+
+    Parameters:
+
+    - ``stages``: The list of ``Stage`` objects to perform.
+    - ``filenames``: The list of result files to analyze.
+    - ``processes``: How many processes to use when loading files.
+    '''
+    fields = sorted({field for stage in stages for field in stage.fields})
+    for filename, data in load_fields(filenames, fields, processes):
+        for stage in stages:
+            stage.add(filename, data)
+    for stage in stages:
+        stage.finish()
+
+
+def run_grouped(factories, filenames, processes=None):
+    '''
+    Similar to ``run``, except a separate stage is created for each group of
+    files, as specified by the stage's ``group``.  Groups are finished in the
+    order they were first seen.
+
+    Parameters:
+
+    - ``factories``: Dictionary mapping stage name to a function which
+      creates a new stage of that type.  Each function must have the
+      ``fields`` and ``group`` of the stage it creates.
+    - ``filenames``: The list of result files to analyze.
+    - ``processes``: How many processes to use when loading files.
+    '''
+    fields = sorted({field for factory in factories.values()
+                     for field in factory.fields})
+    created = OrderedDict()
+    for filename, data in load_fields(filenames, fields, processes):
+        parts = path.basename(filename).split('_')
+        for name, factory in factories.items():
+            key = (name,) + tuple(parts[:factory.group])
+            if key not in created:
+                created[key] = factory()
+            created[key].add(filename, data)
+    for key, stage in created.items():
+        print '========= %s =========' % ' '.join(key)
+        stage.finish()
+
+
+def stage_class(name):
+    '''
+    Imports and returns the class implementing the stage called ``name``.
+    '''
+    module, class_name = stage_classes[name]
+    return getattr(__import__(module), class_name)
+
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Perform multiple analyses on "final" data in one pass.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('filenames', metavar='Result Files', type=str,
+                        nargs='+', help='The result files to analyze')
+    parser.add_argument('-stages', dest='stages', type=str, nargs='+',
+                        default=stage_classes.keys(),
+                        choices=stage_classes.keys(),
+                        help='Which analyses to perform.')
+    parser.add_argument('-rdata', dest='rdata', type=str, default='rdata.csv',
+                        help='Where to write the output of the rdata stage.')
+    parser.add_argument('-processes', dest='processes', type=int,
+                        help='How many processes to use when loading files.')
+    args = parser.parse_args()
+
+    factories = OrderedDict()
+    for name in args.stages:
+        cls = stage_class(name)
+        if name == 'rdata':
+            rdata = open(args.rdata, 'w')
+            factory = lambda cls=cls: cls(rdata)
+        elif name in ['bar', 'never']:
+            # Save the figures without waiting for them to be closed
+            factory = lambda cls=cls: cls(display=False)
+        else:
+            factory = cls
+        factory.fields, factory.group = cls.fields, cls.group
+        factories[name] = factory
+    run_grouped(factories, args.filenames, args.processes)
@@ -3,6 +3,9 @@ Defines each of the benchmark problems used as well as the function sets
 for those problems.
 '''
 from operator import or_, and_, add, sub, mul, div, xor
+from memo import SemanticMemo, direct_lookup
+from semantics import input_semantics
+from util import bitcount
 import itertools
 import random
 import math
@@ -75,6 +78,12 @@ regression_operators = [add, sub,
 # Ensures all regression operators are numerically protected
 regression_operators = [protected(op) for op in regression_operators]
 
+# Names of functions whose output does not depend on the order of their inputs
+commutative = {'or_', 'and_', 'nand', 'nor', 'xor', 'add', 'mul'}
+
+# Problems whose fitness depends on more than what the active nodes compute
+structural = ['Flat', 'Active', 'Novel']
+
 
 class Problem(object):
     '''
@@ -117,11 +126,183 @@ class Bounded_Problem(object):
           - Any configuration information required to construct the problem
             range.
           - ``epsilon``: The amount of allowed error on each test.
+          - ``packed``: Optional, if True individuals are evaluated on every
+            test at once using ``packed_fitness``.  Only binary problems can
+            use this.
+          - ``memo_size``: Optional, if given packed evaluation is used with
+            a ``memo.SemanticMemo`` of this capacity.
+          - ``chunk_size``: Optional, if given packed evaluation is used
+            without ever storing every test.  Tests are generated in chunks
+            of this many tests, which must be a power of two.  Only problems
+            using ``binary_range`` can use this, and semantics are not
+            recorded, so bookkeeping must be ``none``.  See
+            ``chunked_fitness``.
+          - ``racing``: Optional, either ``exact`` or ``approximate``.  If
+            given, offspring are evaluated using ``race``.  Cannot be
+            combined with packed evaluation unless using chunks, which only
+            support ``exact``.
+          - ``racing_confidence``: Optional, with ``approximate`` racing,
+            the required probability that a stopped offspring really was
+            worse than its parent.  Defaults to 0.95.
+          - ``seed``: Optional, used to seed the random numbers used by
+            racing, which are separate from those used by evolution.
         '''
         self.config = config
-        self.training = [(inputs, self.problem_function(inputs))
-                         for inputs in self.data_range(config)]
         self.epsilon = config['epsilon']
+        self.chunk_size = config.get('chunk_size')
+        if self.chunk_size:
+            self.create_chunks(config)
+            tests = self.chunk_size
+        else:
+            self.training = [(inputs, self.problem_function(inputs))
+                             for inputs in self.data_range(config)]
+            tests = len(self.training)
+        self.memo = None
+        self.lookup = None
+        if config.get('memo_size'):
+            self.memo = SemanticMemo(self.operators, tests,
+                                     config['memo_size'])
+            self.lookup = self.memo.lookup
+        elif config.get('packed') or self.chunk_size:
+            self.lookup = direct_lookup(self.operators, tests)
+        if self.lookup is not None and not self.chunk_size:
+            test_inputs = [inputs for inputs, _ in self.training]
+            self.input_semantics = input_semantics(test_inputs,
+                                                   config['input_length'])
+            # Bit ``i`` of each target is the correct output on test ``i``
+            self.targets = [0] * len(self.training[0][1])
+            for number, (_, outputs) in enumerate(self.training):
+                for index, output in enumerate(outputs):
+                    if output:
+                        self.targets[index] |= 1 << number
+        self.racing = config.get('racing')
+        if self.racing is not None:
+            if self.racing not in ['exact', 'approximate']:
+                raise ValueError('Unknown racing mode ' + self.racing)
+            if self.chunk_size:
+                if self.racing != 'exact':
+                    raise ValueError('Chunked evaluation only supports exact'
+                                     ' racing')
+            elif self.lookup is not None:
+                raise ValueError('Racing cannot be combined with packed'
+                                 ' evaluation')
+            # Kept separate so racing does not change how evolution proceeds
+            self.random = random.Random(config.get('seed'))
+            if self.chunk_size:
+                self.order = range(len(self.chunk_targets))
+            else:
+                self.order = range(len(self.training))
+            self.random.shuffle(self.order)
+            # Offspring are checked each time the number of tests performed
+            # reaches a power of two, and each check shares the chance of
+            # stopping an offspring which was not worse
+            checks = max(1, int(math.ceil(math.log(len(self.order), 2))))
+            error = 1 - config.get('racing_confidence', 0.95)
+            self.tolerance = math.log(checks / error) / 2
+        self.start_run()
+
+    def create_chunks(self, config):
+        '''
+        Prepares ``chunked_fitness``, storing the correct outputs for each
+        chunk of tests packed as in ``packed_targets``.  The test inputs are
+        not stored, as ``chunk_values`` can recreate them.
+        '''
+        if self.data_range != binary_range:
+            raise ValueError('Chunked evaluation requires binary_range')
+        if config.get('bookkeeping', 'full') != 'none':
+            raise ValueError('Chunked evaluation requires bookkeeping to be'
+                             ' none')
+        length = config['input_length']
+        self.tests = 2 ** length
+        self.chunk_size = min(self.chunk_size, self.tests)
+        if self.chunk_size & (self.chunk_size - 1):
+            raise ValueError('Chunk size must be a power of two')
+        self.chunk_mask = (1 << self.chunk_size) - 1
+        # Within a chunk, input bit ``b`` of the test number repeats with a
+        # period of ``2 ** (b + 1)`` tests if that is no longer than a chunk
+        self.patterns = []
+        half = 1
+        while 2 * half <= self.chunk_size:
+            block = ((1 << half) - 1) << half
+            self.patterns.append(block * (self.chunk_mask //
+                                          ((1 << 2 * half) - 1)))
+            half *= 2
+        self.chunk_targets = [self.packed_targets(self.chunk_values(chunk),
+                                                  self.chunk_mask)
+                              for chunk in range(self.tests //
+                                                 self.chunk_size)]
+        self.output_count = len(self.chunk_targets[0])
+
+    def chunk_values(self, chunk):
+        '''
+        Returns a list containing the packed value of each input variable
+        on chunk number ``chunk``, in the same order as the tuples returned
+        by ``binary_range``.  Bit ``i`` of each value is the input on test
+        number ``chunk * chunk_size + i``.
+        '''
+        length = self.config['input_length']
+        start = chunk * self.chunk_size
+        values = []
+        for index in range(length):
+            # The first input is the most significant bit of the test number
+            bit = length - 1 - index
+            if bit < len(self.patterns):
+                values.append(self.patterns[bit])
+            elif (start >> bit) & 1:
+                values.append(self.chunk_mask)
+            else:
+                values.append(0)
+        return values
+
+    def packed_targets(self, values, mask):
+        '''
+        Returns the list of correct outputs for a group of tests packed such
+        that bit ``i`` of each output is its correct value on test ``i``.
+        Problems can override this to calculate the outputs using bitwise
+        operations, instead of calling ``problem_function`` once per test.
+
+        Parameters:
+
+        - ``values``: List of the packed value of each input variable, as
+          returned by ``chunk_values``.
+        - ``mask``: Integer with one bit set for each test.
+        '''
+        targets = None
+        for number in range(mask.bit_length()):
+            inputs = tuple((value >> number) & 1 for value in values)
+            outputs = self.problem_function(inputs)
+            if targets is None:
+                targets = [0] * len(outputs)
+            for index, output in enumerate(outputs):
+                if output:
+                    targets[index] |= 1 << number
+        return targets
+
+    def start_run(self):
+        '''
+        Empties the ``memo`` and resets the racing counters at the start of
+        a run.
+        '''
+        if self.memo is not None:
+            self.memo.start_run()
+        self.pruned = 0
+        self.tests_skipped = 0
+
+    def results(self):
+        '''
+        Returns a dictionary describing how evaluation went during the run.
+        Includes the results of ``memo.SemanticMemo.results`` if the memo is
+        used, and if racing is used ``racing_pruned``, the number of
+        offspring stopped early, and ``racing_tests_skipped``, the number of
+        tests they were not evaluated on.
+        '''
+        results = {}
+        if self.memo is not None:
+            results.update(self.memo.results())
+        if self.racing is not None:
+            results.update({'racing_pruned': self.pruned,
+                            'racing_tests_skipped': self.tests_skipped})
+        return results
 
     def get_fitness(self, individual):
         '''
@@ -131,6 +312,14 @@ class Bounded_Problem(object):
 
         - ``individual``: The individual to be evaluated.
         '''
+        if self.chunk_size:
+            return self.chunked_fitness(individual)
+        if self.lookup is not None:
+            return self.packed_fitness(individual)
+        # Individuals which have not been copied from an evaluated parent
+        # are evaluated normally, numbering the tests in order
+        if self.racing is not None and individual.fitness >= 0:
+            return self.race(individual)
         score = 0
         for inputs, outputs in self.training:
             answers = individual.evaluate(inputs)
@@ -142,6 +331,125 @@ class Bounded_Problem(object):
         # Returns the percentage of correct answers
         return 1 - (score / float(len(self.training)))
 
+    def packed_fitness(self, individual):
+        '''
+        Returns the same fitness as ``get_fitness``, up to floating point
+        rounding, by evaluating the individual on every test at once using
+        ``Individual.packed_evaluate``.  Fitness is found from the total
+        number of incorrect outputs, so individuals making the same number
+        of errors always have exactly the same fitness.
+
+        Parameters:
+
+        - ``individual``: The individual to be evaluated.
+        '''
+        if not individual.input_order:
+            # Test inputs are numbered in the order they would be evaluated
+            for inputs, _ in self.training:
+                individual.input_order[inputs] = next(individual.input_counter)
+        answers = individual.packed_evaluate(self.input_semantics,
+                                             self.lookup)
+        errors = sum(bitcount(answer ^ target)
+                     for answer, target in zip(answers, self.targets))
+        return 1 - (errors / float(len(self.targets) * len(self.training)))
+
+    def chunked_fitness(self, individual):
+        '''
+        Returns the same fitness as ``packed_fitness`` by evaluating the
+        individual on one chunk of tests at a time, so memory use depends on
+        ``chunk_size`` instead of the number of tests.  Node semantics for a
+        chunk are calculated in the individual's ``scratch`` space, so
+        ``semantics`` are not recorded.
+
+        With ``exact`` racing, offspring are evaluated on the chunks in a
+        random order and stopped as in ``race`` once they have made more
+        incorrect outputs than their parent.
+
+        Parameters:
+
+        - ``individual``: The individual to be evaluated.
+        '''
+        total = float(self.tests * self.output_count)
+        chunks = range(len(self.chunk_targets))
+        limit = None
+        if self.racing is not None and individual.fitness >= 0:
+            chunks = self.order
+            limit = int(round((1 - individual.fitness) * total))
+        errors = 0
+        for done, chunk in enumerate(chunks, 1):
+            # Input location -1 holds the first input
+            inputs = self.chunk_values(chunk)[::-1]
+            answers = individual.packed_evaluate(inputs, self.lookup,
+                                                 individual.scratch)
+            errors += sum(bitcount(answer ^ target) for answer, target
+                          in zip(answers, self.chunk_targets[chunk]))
+            if limit is not None and errors > limit and done < len(chunks):
+                self.pruned += 1
+                self.tests_skipped += (len(chunks) - done) * self.chunk_size
+                break
+        return 1 - (errors / total)
+
+    def race(self, individual):
+        '''
+        Evaluates an offspring on the tests in a random order, stopping as
+        soon as it is shown to be worse than the parent it was copied from,
+        whose fitness it still holds.  Offspring which are not stopped
+        receive exactly the same fitness as ``get_fitness``.
+
+        With ``exact`` racing, an offspring is stopped once it has made more
+        incorrect outputs than its parent made on all tests, and receives
+        the best fitness it could still have reached.  This never changes
+        which individuals are selected.
+
+        With ``approximate`` racing, an offspring is also stopped if its
+        error rate on the tests performed so far shows, using Hoeffding's
+        inequality with probability ``racing_confidence``, that it is worse
+        than its parent.  It receives the fitness estimated from those
+        tests, which is always worse than its parent's.  The tests are
+        shuffled again for each offspring.
+
+        Parameters:
+
+        - ``individual``: The offspring to be evaluated.
+        '''
+        training = self.training
+        tests = len(training)
+        width = float(len(training[0][1]))
+        # The number of incorrect outputs made by the parent
+        limit = int(round((1 - individual.fitness) * tests * width))
+        order = self.order
+        approximate = self.racing == 'approximate'
+        if approximate:
+            order = list(order)
+            self.random.shuffle(order)
+        parent_rate = limit / (tests * width)
+        checkpoint = 1
+        mistakes = [0] * tests
+        errors = 0
+        for done, number in enumerate(order, 1):
+            inputs, outputs = training[number]
+            answers = individual.evaluate(inputs)
+            wrong = sum(abs(answer - output) > self.epsilon
+                        for answer, output in zip(answers, outputs))
+            mistakes[number] = wrong
+            errors += wrong
+            if errors > limit and done < tests:
+                self.pruned += 1
+                self.tests_skipped += tests - done
+                return 1 - errors / (tests * width)
+            if approximate and done == checkpoint and done < tests:
+                checkpoint *= 2
+                rate = errors / (done * width)
+                if rate - math.sqrt(self.tolerance / done) > parent_rate:
+                    self.pruned += 1
+                    self.tests_skipped += tests - done
+                    return 1 - rate
+        # Summed in the same order as ``get_fitness`` to give the same result
+        score = 0
+        for wrong in mistakes:
+            score += wrong / width
+        return 1 - (score / float(tests))
+
     def problem_function(self, _):
         '''
         Designed to force children of this class to implement this function.
@@ -260,7 +568,9 @@ class Neutral(Problem):
 
     def get_fitness(self, _):
         '''
-        Returns the fitness of passed in individual, which is always 0.
+        Returns the fitness of passed in individual, which is always 0.  The
+        individual is not examined, so only the work done by
+        ``Individual.update_active_nodes`` is needed for each offspring.
         '''
         return 0
 
@@ -275,6 +585,16 @@ class Even_Parity(Bounded_Problem, Binary_Mixin):
         '''
         return [(sum(inputs) + 1) % 2]
 
+    def packed_targets(self, values, mask):
+        '''
+        Returns the packed even parity of each test using bitwise operations.
+        See ``Bounded_Problem.packed_targets``.
+        '''
+        odd = 0
+        for value in values:
+            odd ^= value
+        return [~odd & mask]
+
 
 class Binary_Multiply(Bounded_Problem, Binary_Mixin):
     '''
@@ -296,6 +616,35 @@ class Binary_Multiply(Bounded_Problem, Binary_Mixin):
         extended = multiplied.rjust(len(inputs), '0')
         return map(int, extended)
 
+    def packed_targets(self, values, mask):
+        '''
+        Returns the packed result of multiplying each test's two numbers,
+        using bitwise shift and add multiplication applied to all tests at
+        once.  See ``Bounded_Problem.packed_targets``.
+        '''
+        middle = len(values) / 2
+        # Bits of each number, least significant first
+        first = values[:middle][::-1]
+        second = values[middle:][::-1]
+        product = [0] * len(values)
+        for shift, multiplier in enumerate(second):
+            carry = 0
+            for index, bit in enumerate(first):
+                position = index + shift
+                addend = bit & multiplier
+                total = product[position]
+                product[position] = total ^ addend ^ carry
+                carry = (total & addend) | (carry & (total ^ addend))
+            # Carry into the higher bits of the product
+            position = len(first) + shift
+            while carry and position < len(product):
+                total = product[position]
+                product[position] = total ^ carry
+                carry = total & carry
+                position += 1
+        # Outputs are the most significant bit first
+        return product[::-1]
+
 
 class Binary_Multiply_Miller(Binary_Multiply):
     operators = [and_, and_neg_in, xor, or_]
@@ -413,13 +762,23 @@ class Depth(Problem):
         Saves configuration for use during evaluation.
         '''
         self.config = config
+        # Without bookkeeping, evaluation has no side effects, so the depth
+        # of each node is kept by ``Individual.update_depths`` instead
+        self.incremental = config.get('bookkeeping', 'full') == 'none'
 
     def get_fitness(self, individual):
         '''
         Returns the fitness of the individual as a percentage of maximum
         fitness.
         '''
-        score = individual.evaluate((0,))[0]
+        if not self.incremental:
+            score = individual.evaluate((0,))[0]
+        else:
+            if individual.__dict__.get('depth_of') is not individual.active:
+                # Such as the first individual, which was not created by
+                # ``Individual.new``
+                individual.update_depths()
+            score = individual.depth
         return score / float(self.config['graph_length'])
 
 
@@ -443,6 +802,10 @@ class Flat(Problem):
         '''
         Returns the percentage of connection genes connected to the input.
         '''
+        if 'input_connections' in individual.__dict__:
+            # Kept up to date by ``Individual.count_input_connections``
+            total = len(individual.genes) - individual.graph_length
+            return individual.input_connections / float(total)
         correct, total = 0, 0
         for gene in individual.genes:
             if gene is not None:
@@ -485,7 +848,9 @@ class Active(Problem):
 
     def get_fitness(self, individual):
         '''
-        Returns the percentage of nodes that are active.
+        Returns the percentage of nodes that are active.  ``active`` is
+        already kept up to date from the mutation change log by
+        ``Individual.update_active_nodes``.
         '''
         return len(individual.active) / float(self.config['graph_length'])
 
@@ -0,0 +1,166 @@
+'''
+Builds and queries a SQLite index of the results in the final/ folder, so
+analysis does not have to decompress and parse every file each time.  Each
+file is parsed once and stored as one row per run, containing the
+configuration recovered from the file name and the scalar results of the run.
+The counter dictionaries, such as ``active_nodes_changed``, are stored in
+their own table.  Use this module as an executable to add files to an index:
+
+``python run_index.py final.db final/*.dat.gz``
+
+Files already in the index are only parsed again if their size or
+modification time has changed.  ``make_rdata.py`` and ``stats.py`` accept
+the index in place of result files.
+'''
+
+import sqlite3
+import sys
+from os import path
+from util import load_list, parse_filename
+
+# Configuration values recovered from the file name
+config_columns = ['problem', 'duplication', 'ordering', 'genome_size',
+                  'mutation_rate', 'seed']
+
+# Scalar values stored for each run
+result_columns = ['evals', 'fitness', 'success', 'phenotype', 'unused',
+                  'skipped', 'normal', 'estimated', 'child_replaced_parent',
+                  'parent_not_replaced']
+
+# Dictionaries of frequencies stored for each run
+counter_names = ['active_nodes_changed', 'reactivated_nodes',
+                 'inactive_bits_changed', 'active_bits_changed']
+
+
+def connect(filename):
+    '''
+    Opens the index stored in ``filename``, creating it if necessary.
+
+    Parameters:
+
+    - ``filename``: The path of the SQLite database.
+    '''
+    connection = sqlite3.connect(filename)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, mtime REAL, size INTEGER);
+        CREATE TABLE IF NOT EXISTS runs (
+            path TEXT, run INTEGER, problem TEXT, duplication TEXT,
+            ordering TEXT, genome_size INTEGER, mutation_rate TEXT,
+            seed INTEGER, %s,
+            PRIMARY KEY (path, run));
+        CREATE INDEX IF NOT EXISTS runs_config ON runs (
+            problem, duplication, ordering, genome_size, mutation_rate);
+        CREATE TABLE IF NOT EXISTS counters (
+            path TEXT, run INTEGER, name TEXT, change INTEGER,
+            count INTEGER);
+        CREATE INDEX IF NOT EXISTS counters_run ON counters (
+            path, run, name);
+        ''' % ', '.join(result_columns))
+    return connection
+
+
+def is_current(connection, filename):
+    '''
+    Returns True if ``filename`` is in the index and has not changed since it
+    was added.
+    '''
+    stat = path.getmtime(filename), path.getsize(filename)
+    row = connection.execute('SELECT mtime, size FROM files WHERE path = ?',
+                             (filename,)).fetchone()
+    return row == stat
+
+
+def add_file(connection, filename):
+    '''
+    Parses a single result file and replaces any information already stored
+    about it in the index.  Raises ``ValueError``, ``IOError``, ``EOFError``,
+    ``KeyError`` or ``IndexError`` if the file cannot be parsed.
+
+    Parameters:
+
+    - ``connection``: The index returned by ``connect``.
+    - ``filename``: The result file to add.
+    '''
+    config = parse_filename(filename)
+    data = load_list(filename)
+    stat = path.getmtime(filename), path.getsize(filename)
+    with connection:
+        for table in ['files', 'runs', 'counters']:
+            connection.execute('DELETE FROM %s WHERE path = ?' % table,
+                               (filename,))
+        for run, result in enumerate(data[1:]):
+            row = ([filename, run] + [config[key] for key in config_columns] +
+                   [result.get(key) for key in result_columns])
+            connection.execute('INSERT INTO runs VALUES (%s)' %
+                               ', '.join('?' * len(row)), row)
+            counters = [(filename, run, name, int(change), count)
+                        for name in counter_names
+                        for change, count in result.get(name, {}).items()]
+            connection.executemany('INSERT INTO counters VALUES '
+                                   '(?, ?, ?, ?, ?)', counters)
+        connection.execute('INSERT INTO files VALUES (?, ?, ?)',
+                           (filename,) + stat)
+
+
+def update(connection, filenames):
+    '''
+    Adds all of the ``filenames`` which are not already current in the index.
+    Returns how many files were added.  Files that cannot be parsed are
+    reported as FAILED.
+    '''
+    added = 0
+    for filename in filenames:
+        if is_current(connection, filename):
+            continue
+        try:
+            add_file(connection, filename)
+            added += 1
+        except (ValueError, IOError, EOFError, KeyError, IndexError):
+            print filename, "FAILED"
+    return added
+
+
+def select(connection, columns, **where):
+    '''
+    Returns a list of tuples containing the requested ``columns`` for each
+    run that matches the ``where`` keyword arguments, ordered by file path
+    and run to match the order the files are listed by the shell.
+
+    Parameters:
+
+    - ``connection``: The index returned by ``connect``.
+    - ``columns``: The list of column names to return.
+    - ``where``: Column name and value pairs that must match, for example
+      ``problem='multiply'``.
+    '''
+    keys = sorted(where.keys())
+    query = 'SELECT %s FROM runs' % ', '.join(columns)
+    if keys:
+        query += ' WHERE ' + ' AND '.join(key + ' = ?' for key in keys)
+    query += ' ORDER BY path, run'
+    return connection.execute(query, [where[key] for key in keys]).fetchall()
+
+
+def counter_totals(connection, name, **where):
+    '''
+    Returns a dictionary mapping (path, run) to a dictionary of change -> count
+    for the counter ``name`` of every run matching ``where``.
+    '''
+    keys = sorted(where.keys())
+    query = ('SELECT counters.path, counters.run, change, count FROM counters'
+             ' JOIN runs ON counters.path = runs.path'
+             ' AND counters.run = runs.run WHERE name = ?')
+    query += ''.join(' AND runs.' + key + ' = ?' for key in keys)
+    result = {}
+    for filename, run, change, count in connection.execute(
+            query, [name] + [where[key] for key in keys]):
+        result.setdefault((filename, run), {})[change] = count
+    return result
+
+
+if __name__ == '__main__':
+    connection = connect(sys.argv[1])
+    added = update(connection, sys.argv[2:])
+    total = connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+    print 'Added', added, 'files, index contains', total, 'runs'
@@ -0,0 +1,183 @@
+'''
+Measures how the speed of evolution changes with the number of nodes in the
+genome.  Each combination of problem, ``graph_length``, ordering and
+duplicate handling performs a fixed number of evaluations, and reports the
+evaluations per second, how that time is split between evaluating
+individuals and creating them, and the peak memory used.  Every
+combination is run in its own process so peak memory measurements are
+independent.  Use this module as an executable, for example:
+
+``python scaling.py -problems cfg/parity.cfg -g 100 1000 10000 -csv scaling.csv``
+
+Results can be written as CSV and / or JSON for plotting.
+'''
+
+import sys
+import json
+import random
+import resource
+from os import path
+from subprocess import Popen, PIPE
+from timeit import default_timer
+from collections import defaultdict
+from evolution import multi_indepenedent
+import problems
+import util
+
+# The order in which results are reported
+columns = ['problem', 'graph_length', 'ordering', 'duplicate', 'evals',
+           'generations', 'seconds', 'evals_per_second', 'eval_seconds',
+           'generation_seconds', 'peak_memory_mb']
+
+
+def run_cell(cell):
+    '''
+    Performs evolution using the settings in ``cell`` and returns a
+    dictionary containing the measurements for each of the ``columns``.
+    Should be called in a fresh process, as ``evolution.generate`` replaces
+    methods of ``Individual`` and peak memory covers the whole process.
+
+    Parameters:
+
+    - ``cell``: Dictionary containing:
+
+      - ``problem``: The problem's configuration file.
+      - ``graph_length``, ``ordering``, ``duplicate``: The settings to use.
+      - ``evals``: How many evaluations to perform.
+      - ``max_seconds``: Stop early if this many seconds have passed.
+      - ``seed``: The random seed to use.
+    '''
+    directory = path.dirname(cell['problem'])
+    config = util.load_configurations([path.join(directory, 'once.cfg'),
+                                       cell['problem']])
+    config.update({'graph_length': cell['graph_length'],
+                   'ordering': cell['ordering'],
+                   'duplicate': cell['duplicate']})
+    random.seed(cell['seed'])
+    evaluator = problems.__dict__[config['problem']](config)
+    config['function_list'] = evaluator.operators
+    config['max_arity'] = evaluator.max_arity
+    output = {}
+    generator = multi_indepenedent(config, output, defaultdict(int))
+    generating, evaluating = 0.0, 0.0
+    start = default_timer()
+    evals = 0
+    while evals < cell['evals']:
+        before = default_timer()
+        individual = next(generator)
+        middle = default_timer()
+        individual.fitness = evaluator.get_fitness(individual)
+        after = default_timer()
+        generating += middle - before
+        evaluating += after - middle
+        evals += 1
+        if after - start > cell['max_seconds']:
+            break
+    seconds = default_timer() - start
+    generations = (output['child_replaced_parent'] +
+                   output['parent_not_replaced'])
+    # Linux reports the peak resident set size in kilobytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return {'problem': config['problem'],
+            'graph_length': config['graph_length'],
+            'ordering': config['ordering'],
+            'duplicate': config['duplicate'],
+            'evals': evals,
+            'generations': generations,
+            'seconds': seconds,
+            'evals_per_second': evals / seconds,
+            'eval_seconds': evaluating / evals,
+            'generation_seconds': generating / max(generations, 1),
+            'peak_memory_mb': peak}
+
+
+def run_grid(problem_files, graph_lengths, orderings, duplicates, evals,
+             max_seconds, seed=0):
+    '''
+    Yields the result of ``run_cell`` for every combination of settings,
+    each run in a separate process.  Combinations which fail are reported
+    and skipped.
+
+    Parameters:
+
+    - ``problem_files``: The problem configuration files to use.
+    - ``graph_lengths``: The list of genome sizes to use.
+    - ``orderings``: The list of ordering settings to use.
+    - ``duplicates``: The list of duplicate handling settings to use.
+    - ``evals``: How many evaluations each combination performs.
+    - ``max_seconds``: The time limit for each combination.
+    - ``seed``: The random seed used by every combination.
+    '''
+    for problem_file in problem_files:
+        for graph_length in graph_lengths:
+            for ordering in orderings:
+                for duplicate in duplicates:
+                    cell = {'problem': problem_file,
+                            'graph_length': graph_length,
+                            'ordering': ordering,
+                            'duplicate': duplicate,
+                            'evals': evals,
+                            'max_seconds': max_seconds,
+                            'seed': seed}
+                    process = Popen([sys.executable, path.abspath(__file__),
+                                     '-cell', json.dumps(cell)],
+                                    stdout=PIPE)
+                    stdout, _ = process.communicate()
+                    if process.returncode != 0:
+                        print 'FAILED', cell
+                        continue
+                    yield json.loads(stdout.splitlines()[-1])
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Measure how evolution speed scales with genome size.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-problems', dest='problems', type=str, nargs='+',
+                        default=['cfg/parity.cfg', 'cfg/multiply.cfg'],
+                        help='The problem configuration files to use.')
+    parser.add_argument('-g', dest='graph_lengths', type=int, nargs='+',
+                        default=[100, 1000, 10000, 100000],
+                        help='The numbers of nodes to use.')
+    parser.add_argument('-orderings', dest='orderings', type=str, nargs='+',
+                        default=['normal', 'reorder', 'dag'],
+                        help='The ordering settings to use.')
+    parser.add_argument('-duplicates', dest='duplicates', type=str,
+                        nargs='+',
+                        default=['normal', 'skip', 'accumulate', 'single'],
+                        help='The duplicate handling settings to use.')
+    parser.add_argument('-evals', dest='evals', type=int, default=1000,
+                        help='How many evaluations each setting performs.')
+    parser.add_argument('-max_seconds', dest='max_seconds', type=float,
+                        default=60, help='Stop each setting early after' +
+                        ' this many seconds.')
+    parser.add_argument('-seed', dest='seed', type=int, default=0,
+                        help='The random seed to use.')
+    parser.add_argument('-csv', dest='csv', type=str,
+                        help='Write the results to this CSV file.')
+    parser.add_argument('-json', dest='json', type=str,
+                        help='Write the results to this JSON file.')
+    parser.add_argument('-cell', dest='cell', type=str,
+                        help='Used internally to run a single setting.')
+    args = parser.parse_args()
+
+    if args.cell != None:
+        print json.dumps(run_cell(json.loads(args.cell)))
+        sys.exit()
+
+    results = []
+    for result in run_grid(args.problems, args.graph_lengths, args.orderings,
+                           args.duplicates, args.evals, args.max_seconds,
+                           args.seed):
+        print ' '.join('%s=%.4g' % (column, result[column])
+                       if isinstance(result[column], float)
+                       else '%s=%s' % (column, result[column])
+                       for column in columns)
+        results.append(result)
+    if args.csv != None:
+        with open(args.csv, 'w') as f:
+            f.write(','.join(columns) + '\n')
+            for result in results:
+                f.write(','.join(str(result[column])
+                                 for column in columns) + '\n')
+    if args.json != None:
+        util.save_configuration(args.json, results)
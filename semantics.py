@@ -0,0 +1,224 @@
+'''
+Bit-parallel reconstruction of recorded best individuals for post
+processing.  Instead of evaluating every node once per test input, the
+semantics of a node on all test inputs are stored as the bits of a single
+integer, so each node is evaluated using one bitwise operation.  Bit ``i``
+of a semantic is the node's output on test input number ``i``, the same as
+``Individual.semantics``.
+
+Reconstructions are registered with ``loader`` as the derived field
+``('reconstruct', run)``, so they are computed in parallel and cached along
+with the other fields of a result file.
+'''
+
+import heapq
+import loader
+from history import get_best
+
+# Bitwise versions of the binary operators, given the two input semantics
+# and a mask with one bit set for each test input.
+bit_functions = {'or_': lambda x, y, mask: x | y,
+                 'and_': lambda x, y, mask: x & y,
+                 'xor': lambda x, y, mask: x ^ y,
+                 'nand': lambda x, y, mask: ~(x & y) & mask,
+                 'nor': lambda x, y, mask: ~(x | y) & mask,
+                 'and_neg_in': lambda x, y, mask: ~x & y & mask}
+
+# Names used when classifying nodes, in the order used by ``bar_plot.py``
+node_classes = ['Used', 'Explore', 'Useful', 'Intron', 'Constant']
+
+
+def input_semantics(test_inputs, input_length):
+    '''
+    Returns the list of semantics for each input location, such that
+    ``result[-1]`` is the semantic of input location -1.
+
+    Parameters:
+
+    - ``test_inputs``: The list of test inputs in the order they were first
+      evaluated.
+    - ``input_length``: The number of input variables.
+    '''
+    result = [0] * input_length
+    for number, inputs in enumerate(test_inputs):
+        on = 1 << number
+        for index, value in enumerate(inputs):
+            if value:
+                # Input location -(index + 1) holds the value of inputs[index]
+                result[-(index + 1)] |= on
+    return result
+
+
+def evaluation_order(genes, graph_length, node_step):
+    '''
+    Returns a list of all node indices such that every node comes after all
+    of the nodes it takes input from.  For individuals that are already in
+    order this is simply all node indices in increasing order.
+    '''
+    connections = [genes[node * node_step + 1: (node + 1) * node_step]
+                   for node in range(graph_length)]
+    if all(conn < node for node in range(graph_length)
+           for conn in connections[node]):
+        return range(graph_length)
+    # Topological sort, always adding the lowest index that is ready
+    waiting = [len(set(conn for conn in conns if conn >= 0))
+               for conns in connections]
+    feeds_to = [[] for _ in range(graph_length)]
+    for node, conns in enumerate(connections):
+        for conn in set(conns):
+            if conn >= 0:
+                feeds_to[conn].append(node)
+    order = []
+    addable = [node for node in range(graph_length) if waiting[node] == 0]
+    heapq.heapify(addable)
+    while addable:
+        node = heapq.heappop(addable)
+        order.append(node)
+        for to_add in feeds_to[node]:
+            waiting[to_add] -= 1
+            if waiting[to_add] == 0:
+                heapq.heappush(addable, to_add)
+    return order
+
+
+def active_nodes(genes, graph_length, node_step, output_length):
+    '''
+    Returns the set of node indices reachable from the output genes.
+    '''
+    active = set()
+    working = [gene for gene in genes[-output_length:] if gene >= 0]
+    while working:
+        node = working.pop()
+        if node in active:
+            continue
+        active.add(node)
+        working.extend(conn for conn in
+                       genes[node * node_step + 1: (node + 1) * node_step]
+                       if conn >= 0 and conn not in active)
+    return active
+
+
+def reconstruct(best, test_inputs):
+    '''
+    Returns a dictionary describing the recorded ``best`` individual when
+    every node is evaluated on all ``test_inputs``, containing:
+
+    - ``semantics``: The semantic of every node, followed by the semantics
+      of the input locations.
+    - ``never_active``: List of booleans for if each node was never active.
+    - ``active``: Sorted list of active node indices.
+    - ``simplified``: Sorted list of node indices active after applying
+      ``Individual.simplify``.
+    - ``test_length``: The number of test inputs.
+
+    Individuals using functions without a bitwise version fall back to
+    ``Individual.reconstruct_individual``.
+
+    Parameters:
+
+    - ``best``: The full ``dump`` of an individual.
+    - ``test_inputs``: The list of test inputs from the same run.
+    '''
+    graph_length = best['graph_length']
+    node_step = best['max_arity'] + 1
+    output_length = best['output_length']
+    genes = best['genes']
+    if any(genes[node * node_step] not in bit_functions
+           for node in range(graph_length)):
+        return reconstruct_slowly(best, test_inputs)
+    mask = (1 << len(test_inputs)) - 1
+    semantics = [0] * graph_length + input_semantics(test_inputs,
+                                                     best['input_length'])
+    order = evaluation_order(genes, graph_length, node_step)
+    for node in order:
+        start = node * node_step
+        function = bit_functions[genes[start]]
+        semantics[node] = function(semantics[genes[start + 1]],
+                                   semantics[genes[start + 2]], mask)
+    active = active_nodes(genes, graph_length, node_step, output_length)
+    # Emulates Individual.simplify, favoring nodes early in the order
+    rank = {node: position for position, node in enumerate(order)}
+    lookup = {}
+    for node in sorted(active, key=rank.__getitem__, reverse=True):
+        lookup[semantics[node]] = node
+    for index in range(-best['input_length'], 0):
+        lookup[semantics[index]] = index
+    simplified_genes = [lookup.get(semantics[gene], gene)
+                        if isinstance(gene, int) else gene
+                        for gene in genes]
+    simplified = active_nodes(simplified_genes, graph_length, node_step,
+                              output_length)
+    return {'semantics': semantics,
+            'never_active': [bit == '1' for bit in best['never_active']],
+            'active': sorted(active),
+            'simplified': sorted(simplified),
+            'test_length': len(test_inputs)}
+
+
+def reconstruct_slowly(best, test_inputs):
+    '''
+    Creates the same result as ``reconstruct`` by evaluating the individual
+    one test input at a time.
+    '''
+    from evolution import Individual
+    individual = Individual.reconstruct_individual(best, test_inputs)
+    simplified = individual.new(Individual.simplify)
+    return {'semantics': individual.semantics,
+            'never_active': individual.never_active,
+            'active': list(individual.active),
+            'simplified': list(simplified.active),
+            'test_length': len(test_inputs)}
+
+
+def classify(reconstructed):
+    '''
+    Returns a dictionary mapping each name in ``node_classes`` to a two
+    element list counting how many nodes of that class were active and
+    inactive.  Nodes that were never active are not counted.
+
+    Parameters:
+
+    - ``reconstructed``: A dictionary returned by ``reconstruct``.
+    '''
+    semantics = reconstructed['semantics']
+    # Semantics of always true / always false
+    constants = {0, 2 ** reconstructed['test_length'] - 1}
+    active = set(reconstructed['active'])
+    used = set(reconstructed['simplified'])
+    useful_semantics = {semantics[node] for node in used} - constants
+    active_semantics = {semantics[node] for node in active}
+    counts = {key: [0, 0] for key in node_classes}
+    for node, never_active in enumerate(reconstructed['never_active']):
+        if never_active:
+            continue
+        semantic = semantics[node]
+        if semantic in constants:
+            key = 'Constant'
+        elif semantic in useful_semantics:
+            key = 'Used' if node in used else 'Useful'
+        elif semantic in active_semantics:
+            key = 'Intron'
+        else:
+            key = 'Explore'
+        counts[key][int(node not in active)] += 1
+    return counts
+
+
+def reconstruct_run(data, run):
+    '''
+    Derived field used by ``loader`` to reconstruct the final best of a run,
+    adding the ``reduced`` size and node ``classes`` to the result of
+    ``reconstruct``.
+
+    Parameters:
+
+    - ``data``: The list loaded from a result file.
+    - ``run``: Which run in the file to use.
+    '''
+    best = get_best(data[run]['bests'], -1)
+    reconstructed = reconstruct(best, data[run]['test_inputs'])
+    reconstructed['reduced'] = len(reconstructed['simplified'])
+    reconstructed['classes'] = classify(reconstructed)
+    return reconstructed
+
+loader.derived['reconstruct'] = reconstruct_run
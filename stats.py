@@ -5,69 +5,108 @@ executable to process all result information for a single problem, such as:
 
 ``python stats.py final/multiply*.dat.gz``
 
-Do not mix problems in a single run.
+Do not mix problems in a single run.  Alternatively, pass an index built by
+``run_index.py`` and the name of the problem, which skips the reduced
+phenotype sizes as those require the full files:
+
+``python stats.py final.db multiply``
 
 NOTE: You CANNOT use pypy for this as scipy is current unsupported.  Use
 python 2.7 instead.
 '''
 
-import json
 import sys
 from os import path
 from collections import defaultdict
-from util import median_deviation, open_file_method
-from scipy.stats.mstats import kruskalwallis, mannwhitneyu
-from numpy.ma import masked_array
-from evolution import Individual
+from util import median_deviation
+from pipeline import Stage, run
+# Registers the reconstruct field with the loader
+import semantics
 
 
-def make_rectangular(data, fill):
+class Stats(Stage):
     '''
-    Given data, a list of lists, square off the rows and return a matrix,
-    with empty spaces being ``filled.``
+    Analysis stage which gathers the results of a single problem and
+    compares each variant against the control group.
     '''
-    width = len(max(data, key=len))
-    return [masked_array(line + [fill] * (width - len(line)),
-                         [False] * len(line) + [True] * (width - len(line)))
-            for line in data]
+    fields = [(1, 'evals'), (1, 'phenotype'), ('reconstruct', 1)]
+    group = 1
 
-if __name__ == '__main__':
-    # Run through all of the files gathering different seeds into lists
-    statify = defaultdict(list)
-    active = defaultdict(list)
-    reduced = defaultdict(list)
-    filecount = 0
-    control_group = None
-    for filename in sys.argv[1:]:
+    def __init__(self):
+        # Gathers different seeds into lists
+        self.statify = defaultdict(list)
+        self.active = defaultdict(list)
+        self.reduced = defaultdict(list)
+        self.filecount = 0
+        self.control_group = None
+
+    def add_result(self, version, evals, phenotype, reduced=None):
+        '''
+        Include the result of a single run.
+
+        Parameters:
+
+        - ``version``: Tuple of the duplication, ordering, genome size and
+          mutation rate used by the run.
+        - ``evals``: The number of evaluations the run required.
+        - ``phenotype``: The number of active nodes in the final best.
+        - ``reduced``: The number of active nodes in the final best after
+          simplification, if known.
+        '''
+        if version[:2] == ('skip', 'normal'):
+            self.control_group = version
+        self.statify[version].append(evals)
+        self.active[version].append(phenotype)
+        if reduced is not None:
+            self.reduced[version].append(reduced)
+        self.filecount += 1
+
+    def add(self, filename, data):
+        '''
+        Include the result stored in a single file.
+        '''
         base = path.basename(filename)
         try:
             # Determine the settings from the filename
             problem, dup, ordering, nodes, mut, seed = base.split('_')
-            with open_file_method(filename)(filename, 'r') as f:
-                data = json.load(f)
-            version = dup, ordering, nodes, mut
-            if (dup, ordering) == ('skip', 'normal'):
-                control_group = version
-            statify[version].append(data[1]['evals'])
-            active[version].append(data[1]['phenotype'])
-            best = data[1]['bests'][-1]
-            test = data[1]['test_inputs']
-            individual = Individual.reconstruct_individual(best, test)
-            simplified = individual.new(Individual.simplify)
-            reduced[version].append(len(simplified.active))
-            filecount += 1
+            self.add_result((dup, ordering, nodes, mut), data[1, 'evals'],
+                            data[1, 'phenotype'],
+                            data['reconstruct', 1]['reduced'])
         except ValueError:
             print filename, "FAILED"
 
-    # Kruskal's requires a rectangular matrix
-    rect = make_rectangular(statify.values(), 10000001)
-
-    print 'Files Successfully Loaded', filecount
-    print 'Kruskal Wallis', kruskalwallis(rect)
-    for version, data in statify.iteritems():
-        print '--------- %s ---------' % str(version)
-        print "MES, MAD", median_deviation(data)
-        print 'Active', median_deviation(active[version])
-        print 'Reduced', median_deviation(reduced[version])
-        print 'Mann Whitney U against Control',
-        print mannwhitneyu(statify[control_group], data)
+    def finish(self):
+        '''
+        Print the statistical measures for each variant.
+        '''
+        from interval import kruskal_wallis, mann_whitney_u
+        statify = self.statify
+        versions = statify.keys()
+        samples = [statify[version] for version in versions]
+        # Compares all versions against the control at once
+        against_control = mann_whitney_u(statify[self.control_group], samples)
+
+        print 'Files Successfully Loaded', self.filecount
+        print 'Kruskal Wallis', kruskal_wallis(samples)
+        for version, data, result in zip(versions, samples, against_control):
+            print '--------- %s ---------' % str(version)
+            print "MES, MAD", median_deviation(data)
+            print 'Active', median_deviation(self.active[version])
+            if self.reduced[version]:
+                print 'Reduced', median_deviation(self.reduced[version])
+            print 'Mann Whitney U against Control', result
+
+
+if __name__ == '__main__':
+    stats = Stats()
+    if sys.argv[1].endswith('.db'):
+        from run_index import connect, select
+        columns = ['duplication', 'ordering', 'genome_size', 'mutation_rate',
+                   'evals', 'phenotype']
+        rows = select(connect(sys.argv[1]), columns, problem=sys.argv[2])
+        for dup, ordering, nodes, mut, evals, phenotype in rows:
+            version = str(dup), str(ordering), str(nodes), str(mut)
+            stats.add_result(version, evals, phenotype)
+        stats.finish()
+    else:
+        run([stats], sys.argv[1:])
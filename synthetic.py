@@ -0,0 +1,238 @@
+'''
+Creates synthetic result files in the same layout as the final/ folder, so
+the analysis scripts can be tested and timed without the raw experiment
+data.  Each file is named ``problem_duplication_ordering_nodes_mutation_seed.dat.gz``
+and holds the combined results followed by one line per run, as written by
+``main.py -out``.  Runs include recorded bests with valid genomes, never
+active information, test inputs and the counter dictionaries, but the
+values are only plausible, not the result of evolution.  Use this module as
+an executable to create files, for example:
+
+``python synthetic.py synthetic/ -files 1000 -g 1000 3000``
+
+The problems' input and output sizes and function sets are read from cfg/.
+'''
+
+import math
+import random
+from os import path, makedirs
+from multiprocessing import Pool
+from aggregate import Aggregate
+from history import BestHistory
+import problems
+import util
+
+duplications = ['normal', 'skip', 'accumulate', 'single']
+orderings = ['normal', 'reorder', 'dag']
+
+
+def problem_settings(problem, directory='cfg'):
+    '''
+    Returns the configuration of ``problem`` read from its configuration file,
+    with the names of its functions in ``function_names``.
+    '''
+    config = util.load_configurations([path.join(directory,
+                                                 problem + '.cfg')])
+    evaluator_class = problems.__dict__[config['problem']]
+    config['function_names'] = [function.__name__ for function in
+                                evaluator_class.operators]
+    config['max_arity'] = evaluator_class.max_arity
+    config['data_range'] = evaluator_class.data_range
+    return config
+
+
+def random_genes(rng, config):
+    '''
+    Returns a random, correctly ordered, list of genes using function names.
+    '''
+    genes = []
+    inputs = config['input_length']
+    for node in range(config['graph_length']):
+        genes.append(rng.choice(config['function_names']))
+        genes.extend(rng.randrange(-inputs, node)
+                     for _ in range(config['max_arity']))
+    genes.extend(rng.randrange(-inputs, config['graph_length'])
+                 for _ in range(config['output_length']))
+    return genes
+
+
+def mutate(rng, genes, config, mutation_rate):
+    '''
+    Changes the genes in place in the same way as ``Individual.mutate``.
+    '''
+    node_step = config['max_arity'] + 1
+    inputs = config['input_length']
+    # Skip directly to each mutated gene instead of testing every gene
+    index = int(math.log(1 - rng.random()) / math.log(1 - mutation_rate))
+    while index < len(genes):
+        node, gene = divmod(index, node_step)
+        if node >= config['graph_length']:
+            genes[index] = rng.randrange(-inputs, config['graph_length'])
+        elif gene == 0:
+            genes[index] = rng.choice(config['function_names'])
+        else:
+            genes[index] = rng.randrange(-inputs, node)
+        index += 1 + int(math.log(1 - rng.random()) /
+                         math.log(1 - mutation_rate))
+
+
+def active_nodes(genes, config):
+    '''
+    Returns the set of nodes which are active in ``genes``.
+    '''
+    node_step = config['max_arity'] + 1
+    active = set()
+    working = [gene for gene in genes[-config['output_length']:] if gene >= 0]
+    while working:
+        node = working.pop()
+        if node not in active:
+            active.add(node)
+            working.extend(conn for conn in
+                           genes[node * node_step + 1:(node + 1) * node_step]
+                           if conn >= 0)
+    return active
+
+
+def synthetic_run(rng, config, mutation_rate, keyframe_frequency):
+    '''
+    Returns a dictionary in the same form as ``main.one_run`` for a single
+    made up run.
+
+    Parameters:
+
+    - ``rng``: The ``random.Random`` used to make all choices.
+    - ``config``: The problem settings from ``problem_settings`` with
+      ``graph_length`` set.
+    - ``mutation_rate``: The mutation rate applied between recorded bests.
+    - ``keyframe_frequency``: Passed on to ``history.BestHistory``.
+    '''
+    graph_length = config['graph_length']
+    test_inputs = [list(inputs) for inputs in config['data_range'](config)]
+    rng.shuffle(test_inputs)
+    # Fitness can only change by one output on one test
+    levels = len(test_inputs) * config['output_length']
+    evals = int(min(10000000, rng.lognormvariate(math.log(50000), 0.8)))
+    genes = random_genes(rng, config)
+    never_active = ['1'] * graph_length
+    level = int(rng.uniform(0.4, 0.7) * levels)
+    history = BestHistory(keyframe_frequency)
+    bests = []
+    found = 0
+    while True:
+        active = active_nodes(genes, config)
+        for node in active:
+            never_active[node] = '0'
+        best = {'genes': list(genes),
+                'fitness': level / float(levels),
+                'never_active': ''.join(never_active),
+                'graph_length': graph_length,
+                'max_arity': config['max_arity'],
+                'output_length': config['output_length'],
+                'input_length': config['input_length'],
+                'evals': found}
+        bests.append(history.encode(best))
+        if level == levels:
+            break
+        # Improvements get less frequent as the run progresses
+        found += int((evals - found) * rng.uniform(0.05, 0.3))
+        level = min(levels, level + rng.randint(1, 3))
+        mutate(rng, genes, config, mutation_rate)
+
+    def counter(scale):
+        return {str(change): int(rng.expovariate(1.0 / scale)) + 1
+                for change in range(rng.randint(1, 12))}
+    replaced = evals // 8
+    return {'evals': evals,
+            'normal': evals + int(evals * rng.uniform(0, 2)),
+            'skipped': int(evals * rng.uniform(0, 2)),
+            'estimated': evals * rng.uniform(0, 2),
+            'fitness': 1.0,
+            'success': True,
+            'phenotype': len(active),
+            'unused': never_active.count('1'),
+            'child_replaced_parent': replaced,
+            'parent_not_replaced': evals // 4 - replaced,
+            'active_nodes_changed': counter(evals / 50.0),
+            'active_bits_changed': counter(evals / 50.0),
+            'inactive_bits_changed': counter(evals / 100.0),
+            'reactivated_nodes': counter(evals / 50.0),
+            'test_inputs': test_inputs,
+            'bests': bests}
+
+
+def write_file(args):
+    '''
+    Creates a single synthetic result file given a tuple of the settings
+    needed, as required by ``Pool.imap``.  Returns the file's name.
+    '''
+    (directory, problem, duplication, ordering, graph_length, mutation_rate,
+     seed, runs, keyframe_frequency) = args
+    name = '_'.join([problem, duplication, ordering, str(graph_length),
+                     str(mutation_rate), str(seed)]) + '.dat.gz'
+    rng = random.Random(name)
+    config = problem_settings(problem)
+    config['graph_length'] = graph_length
+    results = [synthetic_run(rng, config, mutation_rate, keyframe_frequency)
+               for _ in range(runs)]
+    combined = Aggregate()
+    for result in results:
+        combined.add(result)
+    filename = path.join(directory, name)
+    util.save_list(filename, [sorted(combined.results().items())] + results)
+    return filename
+
+
+def settings(directory, files, problem_names, graph_lengths, mutation_rate,
+             runs, keyframe_frequency):
+    '''
+    Yields the arguments to ``write_file`` for ``files`` different files,
+    cycling through every combination of problem, duplication, ordering and
+    genome size before increasing the seed.
+    '''
+    combinations = [(problem, duplication, ordering, graph_length)
+                    for problem in problem_names
+                    for duplication in duplications
+                    for ordering in orderings
+                    for graph_length in graph_lengths]
+    for number in range(files):
+        seed, index = divmod(number, len(combinations))
+        problem, duplication, ordering, graph_length = combinations[index]
+        yield (directory, problem, duplication, ordering, graph_length,
+               mutation_rate, seed + 1, runs, keyframe_frequency)
+
+if __name__ == '__main__':
+    import argparse
+    description = 'Create synthetic result files for testing analysis.'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('directory', type=str,
+                        help='The folder to write the files to.')
+    parser.add_argument('-files', dest='files', type=int, default=100,
+                        help='How many files to create.')
+    parser.add_argument('-problems', dest='problems', type=str, nargs='+',
+                        default=['parity', 'multiply', 'decode', 'encode'],
+                        help='Which problems in cfg/ to create files for.')
+    parser.add_argument('-g', dest='graph_lengths', type=int, nargs='+',
+                        default=[3000], help='The genome sizes to use.')
+    parser.add_argument('-m', dest='mutation_rate', type=float,
+                        default=0.01, help='The mutation rate to use.')
+    parser.add_argument('-runs', dest='runs', type=int, default=1,
+                        help='How many runs to include in each file.')
+    parser.add_argument('-keyframe', dest='keyframe_frequency', type=int,
+                        default=50, help='How often recorded bests are' +
+                        ' stored in full.')
+    parser.add_argument('-processes', dest='processes', type=int,
+                        help='How many processes to use.')
+    args = parser.parse_args()
+
+    if not path.exists(args.directory):
+        makedirs(args.directory)
+    pool = Pool(args.processes)
+    jobs = settings(args.directory, args.files, args.problems,
+                    args.graph_lengths, args.mutation_rate, args.runs,
+                    args.keyframe_frequency)
+    for count, filename in enumerate(pool.imap_unordered(write_file, jobs),
+                                     1):
+        if count % 100 == 0:
+            print 'Created', count, 'files'
+    pool.close()
+    print 'Created', args.files, 'files in', args.directory
@@ -0,0 +1,136 @@
+'''
+Periodically reports the progress of a running experiment, so slow or stuck
+runs can be told apart from hung processes.  Every ``stride`` evaluations a
+heartbeat is written to a json file, replacing the previous one, and
+optionally printed.  Each heartbeat contains:
+
+- ``run``, ``evals``: The current run number and evaluations performed.
+- ``evals_per_second``, ``generations_per_second``: Throughput since the
+  previous heartbeat.
+- ``fitness``, ``active``: The best fitness found and its number of active
+  nodes.
+- ``since_improvement``: Evaluations since the best fitness last improved.
+- ``rss_mb``: The current resident memory of the process.
+- ``eta_seconds``: Estimated time until the run reaches ``max_evals``, or
+  None if no evaluations have been made since the previous heartbeat.
+
+Use ``main.py -heartbeat status.json`` to enable it.
+'''
+
+import os
+import json
+import time
+import resource
+from timeit import default_timer
+
+
+def resident_memory():
+    '''
+    Returns the current resident set size of this process in megabytes.  If
+    it cannot be read from /proc, the peak resident set size is used instead.
+    '''
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024.0 * 1024.0)
+    except (IOError, IndexError, ValueError):
+        # Linux reports the peak resident set size in kilobytes
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Heartbeat(object):
+    '''
+    Writes the progress of each run to a heartbeat file.  Call ``start_run``
+    at the start of each run, and ``beat`` every ``stride`` evaluations and
+    when the run finishes.
+    '''
+
+    def __init__(self, filename=None, stride=10000, echo=False, settings=None):
+        '''
+        Parameters:
+
+        - ``filename``: The json file to write each heartbeat to.  If None,
+          no file is written.
+        - ``stride``: How many evaluations between heartbeats.
+        - ``echo``: If True, heartbeats are also printed.
+        - ``settings``: Optional dictionary included in every heartbeat, for
+          instance identifying the configuration being run.
+        '''
+        self.filename = filename
+        self.stride = stride
+        self.echo = echo
+        self.settings = settings or {}
+        self.start_run(0)
+
+    def start_run(self, run):
+        '''
+        Resets the throughput measurements at the start of run number ``run``.
+        '''
+        self.run = run
+        self.last_time = default_timer()
+        self.last_evals = 0
+        self.last_generations = 0
+        self.evals_per_second = 0.0
+        self.generations_per_second = 0.0
+
+    def beat(self, evals, best, last_improved, output, max_evals,
+             status='running'):
+        '''
+        Reports the progress of the current run.
+
+        Parameters:
+
+        - ``evals``: The number of evaluations performed so far.
+        - ``best``: The best individual found so far.
+        - ``last_improved``: The evaluation on which ``best`` was found.
+        - ``output``: The output dictionary filled by ``evolution.generate``.
+        - ``max_evals``: The number of evaluations the run is limited to.
+        - ``status``: Either ``running`` or ``finished``.
+        '''
+        generations = (output['child_replaced_parent'] +
+                       output['parent_not_replaced'])
+        # A run finishing right after a heartbeat keeps the previous rates
+        if evals != self.last_evals:
+            now = default_timer()
+            elapsed = max(now - self.last_time, 1e-9)
+            self.evals_per_second = (evals - self.last_evals) / elapsed
+            self.generations_per_second = ((generations -
+                                            self.last_generations) / elapsed)
+            self.last_time = now
+            self.last_evals = evals
+            self.last_generations = generations
+        record = dict(self.settings)
+        record.update({'status': status,
+                       'time': time.time(),
+                       'pid': os.getpid(),
+                       'run': self.run,
+                       'evals': evals,
+                       'evals_per_second': self.evals_per_second,
+                       'generations_per_second': self.generations_per_second,
+                       'fitness': best.fitness,
+                       'active': len(best.active),
+                       'since_improvement': evals - last_improved,
+                       'rss_mb': resident_memory(),
+                       'eta_seconds': None})
+        if self.evals_per_second > 0:
+            record['eta_seconds'] = ((max_evals - evals) /
+                                     self.evals_per_second)
+        if self.filename is not None:
+            self.write(record)
+        if self.echo:
+            print 'Heartbeat', ' '.join('%s=%.4g' % (key, value)
+                                        if isinstance(value, float)
+                                        else '%s=%s' % (key, value)
+                                        for key, value in
+                                        sorted(record.items()))
+
+    def write(self, record):
+        '''
+        Replaces the heartbeat file with ``record``.  The file is written
+        under a temporary name and renamed so readers never see a partially
+        written heartbeat.
+        '''
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(record, f)
+        os.rename(temporary, self.filename)
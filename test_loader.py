@@ -0,0 +1,55 @@
+'''
+Tests for ``loader``.  Run using ``python -m unittest test_loader``.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import loader
+from util import ResultWriter
+
+
+class TestStreamedFiles(unittest.TestCase):
+    '''
+    Tests loading streamed result files which are still being written.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'partial.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_partial(self, completed):
+        '''
+        Writes a streamed file with ``completed`` finished runs followed by
+        the recorded best of an unfinished run and no combined trailer.
+        '''
+        writer = ResultWriter(self.filename)
+        for _ in range(completed):
+            writer.write_best({'fitness': 0.5})
+            writer.write_run({'evals': 10})
+        writer.write_best({'fitness': 0.25})
+        writer.flush()
+
+    def test_no_completed_run(self):
+        self.write_partial(0)
+        field = (1, 'evals')
+        self.assertIsNone(loader.parse((self.filename, [field])))
+        loaded = list(loader.load_fields([self.filename], [field],
+                                         processes=1, directory=None))
+        self.assertEqual(loaded, [])
+
+    def test_completed_run(self):
+        self.write_partial(1)
+        field = (1, 'evals')
+        self.assertEqual(loader.parse((self.filename, [field])), {field: 10})
+
+    def test_missing_key(self):
+        self.write_partial(1)
+        self.assertIsNone(loader.parse((self.filename, [(1, 'missing')])))
+
+if __name__ == '__main__':
+    unittest.main()
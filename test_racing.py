@@ -0,0 +1,84 @@
+'''
+Tests for racing evaluation in ``problems.Bounded_Problem``.  Run using
+``python -m unittest test_racing``.
+'''
+
+import random
+import unittest
+import problems
+from evolution import Individual, override_methods
+
+
+class TestExactRacing(unittest.TestCase):
+    '''
+    Tests that exact racing gives every offspring the same fitness as
+    evaluating it on every test, unless it was stopped early with a fitness
+    that is still below its parent's.
+    '''
+    improvements = 200
+    offspring = 200
+
+    def make_config(self, problem, input_length, output_length, **settings):
+        '''
+        Returns a configuration for ``problem`` without bookkeeping.
+        '''
+        config = {'problem': problem, 'input_length': input_length,
+                  'output_length': output_length, 'graph_length': 50,
+                  'mutation_rate': 0.05, 'epsilon': 0.01,
+                  'ordering': 'normal', 'duplicate': 'normal',
+                  'bookkeeping': 'none'}
+        config.update(settings)
+        return config
+
+    def compare(self, config, seed):
+        '''
+        Evaluates offspring of a briefly evolved parent with and without
+        exact racing and checks every racing fitness.
+        '''
+        full = problems.__dict__[config['problem']](config)
+        racing = problems.__dict__[config['problem']](
+            dict(config, racing='exact', seed=seed))
+        config = dict(config, function_list=full.operators,
+                      max_arity=full.max_arity)
+        override_methods(config)
+        random.seed(seed)
+        parent = Individual(**config)
+        parent.fitness = full.get_fitness(parent)
+        # Better parents let racing stop more offspring
+        for _ in range(self.improvements):
+            child = parent.new(Individual.mutate, config['mutation_rate'])
+            child.fitness = full.get_fitness(child)
+            if child.fitness >= parent.fitness:
+                parent = child
+        for _ in range(self.offspring):
+            child = parent.new(Individual.mutate, config['mutation_rate'])
+            expected = full.get_fitness(child)
+            # Still holds the parent's fitness, as racing requires
+            raced = racing.get_fitness(child)
+            if raced != expected:
+                self.assertLess(raced, parent.fitness)
+                # Stopped offspring receive the best fitness still possible
+                self.assertLessEqual(expected, raced)
+        # Otherwise racing was never used
+        self.assertGreater(racing.pruned, 0)
+
+    def test_parity(self):
+        for seed in [7, 11]:
+            self.compare(self.make_config('Even_Parity', 4, 1), seed)
+
+    def test_multiply(self):
+        for seed in [7, 11]:
+            self.compare(self.make_config('Binary_Multiply', 6, 6), seed)
+
+    def test_chunked_parity(self):
+        for seed in [7, 11]:
+            self.compare(self.make_config('Even_Parity', 4, 1, chunk_size=2),
+                         seed)
+
+    def test_chunked_multiply(self):
+        for seed in [7, 11]:
+            self.compare(self.make_config('Binary_Multiply', 6, 6,
+                                          chunk_size=8), seed)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,10 +3,15 @@ Collection of utility functions with no other obvious home.
 '''
 from itertools import izip, cycle
 from collections import defaultdict
+from array import array
+from timeit import default_timer
+from base64 import b64encode, b64decode
+from binascii import hexlify, unhexlify
 import json
 import os
 import math
 import gzip
+import sys
 
 
 def diff_count(data1, data2):
@@ -27,6 +32,28 @@ def open_file_method(filename):
     return open
 
 
+def parse_filename(filename):
+    '''
+    Recovers the configuration of a result file from its name, which should
+    be in the form ``problem_duplication_ordering_nodes_mutation_seed.dat.gz``.
+    Returns a dictionary using the column names of ``rdata.csv``, with the
+    mutation rate kept as written in the name.  Raises ``ValueError`` if the
+    name is not in the correct form.
+
+    Parameters:
+
+    - ``filename``: The path of the result file.
+    '''
+    base = os.path.basename(filename)
+    problem, dup, ordering, nodes, mut, seed = base.split('_')
+    return {'problem': problem,
+            'duplication': dup,
+            'ordering': ordering,
+            'genome_size': int(nodes),
+            'mutation_rate': mut,
+            'seed': int(seed.split('.')[0])}
+
+
 def load_configurations(filenames):
     '''
     Given a list of files containing json encoded dictionaries, combined
@@ -81,6 +108,269 @@ def save_list(filename, data):
         f.write(']' + os.linesep)
 
 
+class ResultWriter(object):
+    '''
+    Streams results to a file in json lines format as they are produced,
+    instead of holding them in memory until all runs are finished.  Each line
+    is a dictionary whose ``record`` value specifies what it contains:
+
+    - ``best``: A single recorded best individual from run number ``run``.
+    - ``run``: The ``result`` dictionary for run number ``run``, without its
+      ``bests``.
+    - ``combined``: Trailer containing the ``combined`` results of all runs.
+
+    Use ``load_list`` to read the file back in the same layout as
+    ``save_list``.
+    '''
+
+    def __init__(self, filename, flush_frequency=100):
+        '''
+        Open a new file for streaming.  Will attempt to use file extension to
+        detect correct file type.
+
+        Parameters:
+
+        - ``filename``: The path to write to.
+        - ``flush_frequency``: The number of records to write between flushes.
+        '''
+        self.file = open_file_method(filename)(filename, 'w')
+        self.flush_frequency = flush_frequency
+        self.unflushed = 0
+        self.run = 0
+
+    def write(self, record):
+        '''
+        Write a single dictionary as a line of the file, periodically flushing
+        the results to disk.
+
+        Parameters:
+
+        - ``record``: The dictionary to write.
+        '''
+        self.file.write(json.dumps(record) + '\n')
+        self.unflushed += 1
+        if self.unflushed >= self.flush_frequency:
+            self.flush()
+
+    def flush(self):
+        '''
+        Ensures everything written so far can be read back from disk.
+        '''
+        self.file.flush()
+        self.unflushed = 0
+
+    def write_best(self, best):
+        '''
+        Record a new best individual for the current run.
+        '''
+        self.write({'record': 'best', 'run': self.run, 'best': best})
+
+    def write_run(self, result):
+        '''
+        Record the results of a completed run and move on to the next run.
+        '''
+        self.write({'record': 'run', 'run': self.run, 'result': result})
+        self.flush()
+        self.run += 1
+
+    def write_combined(self, combined):
+        '''
+        Write the trailer containing the results combined over all runs.
+        '''
+        self.write({'record': 'combined', 'combined': combined})
+        self.flush()
+
+    def close(self):
+        '''
+        Finish writing the file.
+        '''
+        self.file.close()
+
+
+class PhaseTimer(object):
+    '''
+    Accumulates the wall time spent in, and number of calls to, each phase of
+    evolution.  Time is measured in laps: ``start`` marks the beginning of a
+    phase and ``lap`` charges all time since the last mark to the named
+    phase.
+    '''
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.last = default_timer()
+
+    def start(self):
+        '''
+        Mark the beginning of a new phase.
+        '''
+        self.last = default_timer()
+
+    def lap(self, phase):
+        '''
+        Charge the time since the last mark to ``phase`` and start the next
+        phase.
+        '''
+        now = default_timer()
+        self.seconds[phase] += now - self.last
+        self.calls[phase] += 1
+        self.last = now
+
+    def new(self, individual, modification_method, *args):
+        '''
+        Returns ``individual.new(modification_method, *args)``, charging the
+        copy, the modification and determining the active nodes to the
+        ``copy``, ``mutation`` and ``active`` phases respectively.
+        '''
+        def timed(target, *args):
+            self.lap('copy')
+            modification_method(target, *args)
+            self.lap('mutation')
+        self.start()
+        new = individual.new(timed, *args)
+        self.lap('active')
+        return new
+
+    def results(self):
+        '''
+        Returns a dictionary containing the ``phase_seconds`` and
+        ``phase_calls`` dictionaries, each mapping phase name to its total.
+        '''
+        return {'phase_seconds': dict(self.seconds),
+                'phase_calls': dict(self.calls)}
+
+
+def load_list(filename):
+    '''
+    Read the list of dictionaries written by either ``save_list`` or
+    ``ResultWriter``.  Streamed files are converted to the ``save_list``
+    layout, with the combined results first and each completed run's
+    ``bests`` restored.  If a streamed file was not finished, any incomplete
+    run is ignored and the combined results are an empty list.
+
+    Parameters:
+
+    - ``filename``: The path to read from.
+    '''
+    with open_file_method(filename)(filename, 'r') as f:
+        first = f.read(1)
+        while first.isspace():
+            first = f.read(1)
+        if first == '[':
+            return json.loads(first + f.read())
+        combined = []
+        runs = []
+        bests = defaultdict(list)
+        line = first
+        try:
+            for remainder in f:
+                line += remainder
+                if not line.endswith('\n'):
+                    # Partially written final line
+                    break
+                record = json.loads(line)
+                line = ''
+                if record['record'] == 'best':
+                    bests[record['run']].append(record['best'])
+                elif record['record'] == 'run':
+                    result = record['result']
+                    result['bests'] = bests.pop(record['run'], [])
+                    runs.append(result)
+                else:
+                    combined = record['combined']
+        except (IOError, EOFError):
+            # File was truncated before it was closed
+            pass
+    return [combined] + runs
+
+
+def pack_genome(data):
+    '''
+    Returns a copy of a ``dump``ed individual using the compact encoding.
+    Function genes are replaced by indices into the ``functions`` table and
+    stored as an array of unsigned bytes, connection genes are stored as an
+    array of the smallest signed integer type that can hold them (up to 32
+    bits), and ``never_active`` is stored as a bit set.  All three are little
+    endian and base64 encoded.  Use ``unpack_genome``
+    to recover the original.
+
+    Parameters:
+
+    - ``data``: The dictionary returned by ``Individual.dump``.
+    '''
+    node_step = data['max_arity'] + 1
+    function_end = data['graph_length'] * node_step
+    functions = []
+    function_genes = array('B')
+    connections = []
+    for index, gene in enumerate(data['genes']):
+        if index < function_end and index % node_step == 0:
+            try:
+                function_genes.append(functions.index(gene))
+            except ValueError:
+                function_genes.append(len(functions))
+                functions.append(gene)
+        else:
+            connections.append(gene)
+    largest = max([abs(gene) for gene in connections] + [0])
+    typecode = 'b' if largest < 2 ** 7 else 'h' if largest < 2 ** 15 else 'i'
+    connection_genes = array(typecode, connections)
+    if sys.byteorder == 'big':
+        connection_genes.byteswap()
+    never_active = data['never_active']
+    # Bits are stored in the same order as the string, padded to full bytes
+    padded = never_active + '0' * (-len(never_active) % 8)
+    bits = '%x' % int('1' + padded, 2) if padded else '1'
+    result = dict(data)
+    del result['genes']
+    del result['never_active']
+    result.update({'functions': functions,
+                   'function_genes': b64encode(function_genes.tostring()),
+                   'connection_genes': b64encode(connection_genes.tostring()),
+                   'connection_type': typecode,
+                   'never_active_bits': b64encode(unhexlify(bits[1:])),
+                   'never_active_length': len(never_active)})
+    return result
+
+
+def unpack_genome(data):
+    '''
+    Returns a copy of an individual encoded by ``pack_genome`` in the
+    original ``dump`` format.  Dictionaries already in that format are
+    returned unchanged.
+
+    Parameters:
+
+    - ``data``: The packed dictionary.
+    '''
+    if 'connection_genes' not in data:
+        return data
+    node_step = data['max_arity'] + 1
+    functions = data['functions']
+    function_genes = array('B', b64decode(data['function_genes']))
+    connection_genes = array(data['connection_type'],
+                             b64decode(data['connection_genes']))
+    if sys.byteorder == 'big':
+        connection_genes.byteswap()
+    genes = []
+    for node_index, function in enumerate(function_genes):
+        start = node_index * (node_step - 1)
+        genes.append(functions[function])
+        genes.extend(connection_genes[start:start + node_step - 1])
+    genes.extend(connection_genes[len(function_genes) * (node_step - 1):])
+    length = data['never_active_length']
+    bits = hexlify(b64decode(data['never_active_bits']))
+    never_active = bin(int('1' + bits, 16))[3:3 + length] if bits else ''
+    result = dict(data)
+    for key in ['functions', 'function_genes', 'connection_genes',
+                'connection_type', 'never_active_bits',
+                'never_active_length']:
+        del result[key]
+    result['genes'] = genes
+    result['never_active'] = never_active
+    return result
+
+
 def meanstd(data):
     '''
     Returns the mean and standard deviation of the given data.